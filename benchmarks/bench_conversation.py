@@ -0,0 +1,111 @@
+"""
+Offline benchmark for the conversation engine's streaming path.
+
+Replays synthetic (or recorded) converse_stream fixtures through
+process_ai_response with a fake Bedrock client and recorded tool results,
+and reports per-event handler CPU, render calls, peak allocations and
+end-to-end turn time. No AWS credentials or network access are needed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_conversation
+    python -m benchmarks.bench_conversation --fixture recorded.json --tokens-per-second 80
+"""
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+import streamlit as st
+
+from src.conversation_handler import process_ai_response
+from src.replay import FakeBedrockClient, load_fixture, replaying_tool_calls, synthetic_fixture
+
+SCENARIOS = {
+    "short": dict(answer_tokens=50),
+    "long": dict(answer_tokens=5000),
+    "tool_heavy": dict(answer_tokens=300, tool_rounds=3, tools_per_round=3, tool_result_chars=20000),
+}
+
+
+class CountingPlaceholder:
+    """Stand-in for st.empty() that only counts render calls."""
+
+    renders = 0
+
+    def markdown(self, body, *args, **kwargs):
+        CountingPlaceholder.renders += 1
+
+    def empty(self):
+        pass
+
+
+def run_turn(fixture, tokens_per_second=None, tool_latency=0.0):
+    client = FakeBedrockClient(fixture, tokens_per_second)
+    messages = [{"role": "user", "content": [{"text": "Benchmark prompt"}]}]
+    st.session_state.display_messages = []
+    CountingPlaceholder.renders = 0
+    with replaying_tool_calls(fixture, tool_latency):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        process_ai_response(client, "synthetic", messages, [], {}, {}, {"tools": []})
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+    events = sum(len(turn["events"]) for turn in fixture["turns"])
+    return {"wall": wall, "cpu": cpu, "events": events, "renders": CountingPlaceholder.renders}
+
+
+def measure_peak_allocations(fixture):
+    tracemalloc.start()
+    run_turn(fixture)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark(name, fixture, iterations, tokens_per_second, tool_latency):
+    runs = [run_turn(fixture, tokens_per_second, tool_latency) for _ in range(iterations)]
+    best = min(runs, key=lambda run: run["cpu"])
+    return {
+        "scenario": name,
+        "events": best["events"],
+        "cpu_us_per_event": best["cpu"] / best["events"] * 1e6,
+        "renders": best["renders"],
+        "peak_alloc_kib": measure_peak_allocations(fixture) / 1024,
+        "turn_ms": min(run["wall"] for run in runs) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", help="Recorded fixture to replay instead of the synthetic scenarios")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Pace replayed deltas (default: unthrottled)")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="Seconds each replayed tool call takes")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    st.empty = CountingPlaceholder
+
+    if args.fixture:
+        fixtures = {args.fixture: load_fixture(args.fixture)}
+    else:
+        fixtures = {name: synthetic_fixture(**options) for name, options in SCENARIOS.items()}
+
+    results = [
+        benchmark(name, fixture, args.iterations, args.tokens_per_second, args.tool_latency)
+        for name, fixture in fixtures.items()
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<14}{'events':>8}{'cpu us/event':>14}{'renders':>9}{'peak KiB':>10}{'turn ms':>10}")
+    for result in results:
+        print(f"{result['scenario']:<14}{result['events']:>8}{result['cpu_us_per_event']:>14.1f}"
+              f"{result['renders']:>9}{result['peak_alloc_kib']:>10.0f}{result['turn_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
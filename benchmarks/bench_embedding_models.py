@@ -0,0 +1,87 @@
+"""
+Compare cold load time and throughput of the memory store's embedding models.
+
+Measures Chroma's default embedding function (which pads every batch to 256
+tokens) against the vendored model in EMBEDDING_MODEL_PATH, at fp32 and,
+if model.int8.onnx exists, int8. Cold load is the time from constructing
+the function to its first embedding. Throughput is embeddings/sec over
+memory-sized texts, and each variant's cosine similarity to the first
+model's embeddings (the default one, when it can be loaded) shows how much
+quantization moves them.
+
+Build the vendored model first with scripts/vendor_embedding_model.py.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_embedding_models --model-dir models/all-MiniLM-L6-v2
+    python -m benchmarks.bench_embedding_models --model-dir models/all-MiniLM-L6-v2 --texts 2000 --threads 2
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+from src.embedding_model import EMBEDDING_MODEL_PATH, QUANTIZED_MODEL_FILE, LocalOnnxEmbeddingFunction
+
+WORDS = (
+    "user prefers green tea meetings on tuesday remind about the quarterly report rss feed "
+    "https://example.com/feed.xml bitcoin price alert portfolio rebalance project deadline "
+    "python script deploy container logs backup schedule travel plans berlin conference"
+).split()
+
+
+def sample_texts(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))) for _ in range(n)]
+
+
+def measure(make_function, texts, batch_size):
+    started = time.perf_counter()
+    function = make_function()
+    function(texts[:1])
+    cold_load = time.perf_counter() - started
+
+    started = time.perf_counter()
+    embeddings = []
+    for start in range(0, len(texts), batch_size):
+        embeddings.extend(function(texts[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+    return cold_load, len(texts) / elapsed, np.asarray(embeddings, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default=EMBEDDING_MODEL_PATH, help="Vendored model directory")
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads for the vendored model")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    variants = [("chroma default", embedding_functions.DefaultEmbeddingFunction)]
+    if args.model_dir:
+        variants.append(("vendored fp32", lambda: LocalOnnxEmbeddingFunction(args.model_dir, threads=args.threads)))
+        if os.path.exists(os.path.join(args.model_dir, QUANTIZED_MODEL_FILE)):
+            variants.append(("vendored int8", lambda: LocalOnnxEmbeddingFunction(args.model_dir, quantized=True, threads=args.threads)))
+    else:
+        print("No --model-dir or EMBEDDING_MODEL_PATH given; measuring only the default model.")
+
+    print(f"{'model':16} {'cold load':>10} {'emb/s':>9} {'cos vs first':>15}")
+    reference = None
+    for name, make_function in variants:
+        try:
+            cold_load, throughput, embeddings = measure(make_function, texts, args.batch_size)
+        except Exception as e:
+            # The default model is downloaded on first use, which fails in air-gapped containers.
+            print(f"{name:16} unavailable: {e}")
+            continue
+        if reference is None:
+            reference = embeddings
+        similarity = float(np.mean(np.sum(embeddings * reference, axis=1)))
+        print(f"{name:16} {cold_load * 1000:8.0f}ms {throughput:9.1f} {similarity:15.4f}")
+
+
+if __name__ == "__main__":
+    main()
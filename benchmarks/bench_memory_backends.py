@@ -0,0 +1,125 @@
+"""
+Compare recall_memories backends: Chroma vs the memory-mapped NumPy index.
+
+For each store size, the same synthetic clustered embeddings are loaded into
+a Chroma collection, a float32 NumpyCollection and an int8-quantized one,
+then each is queried with the same probes. Reports build time, median and
+p95 query latency, resident memory growth, on-disk size and recall@k
+against exact brute-force search. Embeddings are passed in directly, so no
+embedding model download is needed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_memory_backends
+    python -m benchmarks.bench_memory_backends --sizes 1000,10000,100000 --queries 200
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from src.vector_store import NumpyCollection
+
+DIM = 384
+
+
+def synthetic_embeddings(n, dim, seed=0, clusters=64):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def build_chroma(path, ids, vectors, documents):
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_or_create_collection("memories", embedding_function=None)
+    batch = client.get_max_batch_size()
+    for start in range(0, len(ids), batch):
+        collection.add(
+            ids=ids[start:start + batch],
+            embeddings=vectors[start:start + batch].tolist(),
+            documents=documents[start:start + batch]
+        )
+    return collection
+
+
+def build_numpy(path, ids, vectors, documents, quantize):
+    collection = NumpyCollection(path, quantize=quantize)
+    batch = 5000
+    for start in range(0, len(ids), batch):
+        collection.add(ids=ids[start:start + batch], embeddings=vectors[start:start + batch], documents=documents[start:start + batch])
+    return collection
+
+
+def run_backend(name, build, queries, truth, k):
+    path = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        collection = build(path)
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=k)
+            latencies.append(time.perf_counter() - started)
+            hits += len(set(result["ids"][0]) & expected)
+        return {
+            "backend": name,
+            "build_s": build_seconds,
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+            "rss_mib": (rss_bytes() - rss_before) / 2**20,
+            "disk_mib": dir_size(path) / 2**20,
+            "recall": hits / (len(queries) * k),
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'memories':>9} {'backend':<14}{'build s':>9}{'p50 ms':>9}{'p95 ms':>9}{'RSS MiB':>9}{'disk MiB':>10}{'recall@' + str(args.k):>11}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = synthetic_embeddings(size, DIM)
+        ids = [f"memory-{i}" for i in range(size)]
+        documents = [f"Synthetic memory number {i}" for i in range(size)]
+        queries = synthetic_embeddings(args.queries, DIM, seed=1)
+        exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+        truth = [{ids[i] for i in row} for row in exact]
+
+        backends = [
+            ("chroma", lambda path: build_chroma(path, ids, vectors, documents)),
+            ("numpy-f32", lambda path: build_numpy(path, ids, vectors, documents, quantize=False)),
+            ("numpy-int8", lambda path: build_numpy(path, ids, vectors, documents, quantize=True)),
+        ]
+        for name, build in backends:
+            result = run_backend(name, build, queries, truth, args.k)
+            print(f"{size:>9} {result['backend']:<14}{result['build_s']:>9.2f}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                  f"{result['rss_mib']:>9.1f}{result['disk_mib']:>10.1f}{result['recall']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,16 @@ from PIL import Image
 
 from src.bedrock_client import create_bedrock_client
 from src.conversation_handler import handle_chat_input, process_ai_response
-from src.memory_manager import MemoryManager
-from src.utils import format_rss_results, format_search_results, new_chat, calculate_cost
-from src.personas import get_persona_names, get_tools_for_persona, get_system_prompt_for_persona
+from src.memory_manager import get_memory_manager, get_memory_status, set_current_tenant, warm_up_memory_manager
+from src.attachments import attachment_store
+from src.kernel_pool import PYTHON_KERNEL_POOL_SIZE, get_kernel_pool
+from src.chat_context import new_chat_id, set_current_chat
+from src.utils import format_rss_results, format_search_results, new_chat, calculate_cost, resolve_tenant_id
+from src.personas import get_persona_names, get_tools_for_persona, get_system_prompt_for_persona, should_prefetch_memory
+from src.prefetch import collect_prefetch, start_prefetch
 from src.tools import get_dynamic_tool_config
+from src.http_client import get_http_stats
+from src.replay import RECORD_PATH, ConversationRecorder, recording_tool_calls
 
 os.chdir(Path(__file__).parent)
 
@@ -51,6 +57,14 @@ def initialize_session_state():
         }
     if "selected_persona" not in st.session_state:
         st.session_state.selected_persona = "Personal Assistant"
+    if "history_tokens_saved" not in st.session_state:
+        st.session_state.history_tokens_saved = 0
+    if "turn_history_tokens_saved" not in st.session_state:
+        st.session_state.turn_history_tokens_saved = 0
+    if "tenant_id" not in st.session_state:
+        st.session_state.tenant_id = resolve_tenant_id()
+    if "chat_id" not in st.session_state:
+        st.session_state.chat_id = new_chat_id()
 
 def display_token_usage_and_cost(model_id):
     if st.session_state.total_token_usage['totalTokens'] > 0:
@@ -62,12 +76,38 @@ def display_token_usage_and_cost(model_id):
             f"Input Tokens: {st.session_state.total_token_usage['inputTokens']}<br>"
             f"Output Tokens: {st.session_state.total_token_usage['outputTokens']}<br>"
             f"Total Tokens: {st.session_state.total_token_usage['totalTokens']}<br>"
-            f"Estimated Cost: {cost}",
+            f"Estimated Cost: {cost}<br>"
+            f"Input Tokens Saved by History Compaction: ~{st.session_state.turn_history_tokens_saved} last turn, "
+            f"~{st.session_state.history_tokens_saved} total",
             unsafe_allow_html=True
         )
     else:
         st.sidebar.markdown("No token usage yet.")
 
+def display_memory_status():
+    status = get_memory_status()
+    if status == "warming up":
+        st.sidebar.caption("Memory: warming up (first run downloads the embedding model)...")
+    elif status == "failed":
+        st.sidebar.caption("Memory: failed to initialize, see logs.")
+    elif status == "ready":
+        cache_stats = get_memory_manager().get_embedding_cache_stats()
+        st.sidebar.caption(f"Memory embedding cache hit rate: {cache_stats['hit_rate']:.0%}")
+        compaction_stats = get_memory_manager().last_compaction_stats
+        if compaction_stats:
+            st.sidebar.caption(
+                f"Last memory compaction reclaimed {compaction_stats['entries_reclaimed']} entries "
+                f"({compaction_stats['bytes_reclaimed'] / 1024:.1f} KB)"
+            )
+
+def display_tool_http_stats():
+    http_stats = get_http_stats()
+    if http_stats:
+        st.sidebar.caption("Tool HTTP calls: " + ", ".join(
+            f"{tool} {stats['requests']} ({stats['failures']} failed, {stats['avg_seconds']:.2f}s avg)"
+            for tool, stats in sorted(http_stats.items())
+        ))
+
 def setup_sidebar():
     st.sidebar.button("New Chat", type="primary", on_click=new_chat)
 
@@ -98,7 +138,7 @@ def display_chat_messages():
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
             if "image" in message:
-                st.image(message["image"], caption="Uploaded Image", width=300)
+                st.image(attachment_store.get_thumbnail(message["image"]), caption="Uploaded Image", width=300)
             elif "document" in message:
                 st.markdown(f"Document uploaded: {message['document']}")
             
@@ -137,8 +177,19 @@ def handle_user_input(prompt, file_content, file_name, bedrock_client, model_id,
                 else:
                     st.markdown(f"Document uploaded: {name}")
 
+        prefetch = None
+        if should_prefetch_memory(st.session_state.selected_persona):
+            prefetch = start_prefetch(prompt, st.session_state.get("user_profile"))
+
         handle_chat_input(prompt, file_content, file_name)
 
+        if prefetch:
+            profile, prefetched_context = collect_prefetch(prefetch)
+            st.session_state.user_profile = profile
+            if prefetched_context:
+                # Sent with this turn only; it is not stored in the history.
+                system_prompts = system_prompts + [{"text": prefetched_context}]
+
         updated_token_usage = process_ai_response(
             bedrock_client, 
             model_id, 
@@ -167,6 +218,8 @@ def main():
     st.title("ToolboxAI")
 
     initialize_session_state()
+    set_current_tenant(st.session_state.tenant_id)
+    set_current_chat(st.session_state.chat_id)
 
     model_id, region_name = setup_sidebar()
 
@@ -183,6 +236,8 @@ def main():
     system_prompt = get_system_prompt_for_persona(st.session_state.selected_persona)
     
     bedrock_client = create_bedrock_client(region_name)
+    if RECORD_PATH:
+        bedrock_client = ConversationRecorder(bedrock_client, RECORD_PATH)
     system_prompts = [{"text": system_prompt}]
     inference_config = {"temperature": 0.7}
     additional_model_fields = {"top_k": 200}
@@ -190,8 +245,10 @@ def main():
     selected_tools = get_tools_for_persona(st.session_state.selected_persona)
     dynamic_tool_config = get_dynamic_tool_config(selected_tools)
 
-    with st.spinner("Initializing memory management. This may take a moment on first run..."):
-        MemoryManager()
+    # Shared by every session; only the first rerun in the process starts them.
+    warm_up_memory_manager()
+    if PYTHON_KERNEL_POOL_SIZE > 0:
+        get_kernel_pool()
 
     display_chat_messages()
 
@@ -203,10 +260,16 @@ def main():
             file_content = uploaded_file.getvalue()
             file_name = uploaded_file.name
 
-        handle_user_input(prompt, file_content, file_name, bedrock_client, model_id, system_prompts, inference_config, additional_model_fields, dynamic_tool_config)
+        if RECORD_PATH:
+            with recording_tool_calls(bedrock_client):
+                handle_user_input(prompt, file_content, file_name, bedrock_client, model_id, system_prompts, inference_config, additional_model_fields, dynamic_tool_config)
+        else:
+            handle_user_input(prompt, file_content, file_name, bedrock_client, model_id, system_prompts, inference_config, additional_model_fields, dynamic_tool_config)
 
     # Display token usage and cost at the end
     display_token_usage_and_cost(model_id)
+    display_memory_status()
+    display_tool_http_stats()
 
 if __name__ == "__main__":
     main()
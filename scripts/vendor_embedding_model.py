@@ -0,0 +1,100 @@
+"""
+Vendor the memory store's embedding model into a local directory.
+
+Copies Chroma's all-MiniLM-L6-v2 ONNX model (downloading it once if it is
+not cached yet) into --dest, optionally writes an int8 dynamically
+quantized copy next to it, and records a manifest with a version and file
+checksums. It then checks that a memory store created with Chroma's default
+embedding function reopens with the vendored one. Point EMBEDDING_MODEL_PATH at --dest so the app never downloads
+the model at run time; the Dockerfile runs this at image build time.
+
+Quantizing needs the onnx package (pip install onnx), which is only
+required while building.
+
+Usage (from the repository root):
+    python -m scripts.vendor_embedding_model --dest models/all-MiniLM-L6-v2
+    python -m scripts.vendor_embedding_model --dest models/all-MiniLM-L6-v2 --quantize
+    python -m scripts.vendor_embedding_model --dest models/all-MiniLM-L6-v2 --source /path/to/onnx
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import chromadb
+from chromadb.utils import embedding_functions
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+from src.embedding_model import MANIFEST_FILE, MODEL_FILE, QUANTIZED_MODEL_FILE, REQUIRED_FILES, LocalOnnxEmbeddingFunction
+
+
+def default_source():
+    model = ONNXMiniLM_L6_V2()
+    model._download_model_if_not_exists()
+    return os.path.join(model.DOWNLOAD_PATH, model.EXTRACTED_FOLDER_NAME)
+
+
+def quantize(dest):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        os.path.join(dest, MODEL_FILE),
+        os.path.join(dest, QUANTIZED_MODEL_FILE),
+        weight_type=QuantType.QInt8
+    )
+
+
+def check_reopens_default_store(dest):
+    # Chroma persists the embedding function's name with each collection and refuses a different one.
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(path=path)
+        collection = client.get_or_create_collection("memories", embedding_function=embedding_functions.DefaultEmbeddingFunction())
+        collection.add(ids=["check"], documents=["check"], embeddings=[[0.0] * 384])
+        chromadb.api.client.SharedSystemClient.clear_system_cache()
+        client = chromadb.PersistentClient(path=path)
+        collection = client.get_or_create_collection("memories", embedding_function=LocalOnnxEmbeddingFunction(dest))
+        collection.query(query_texts=["check"], n_results=1)
+        chromadb.api.client.SharedSystemClient.clear_system_cache()
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dest", required=True, help="Directory to write the model to")
+    parser.add_argument("--source", help="Existing all-MiniLM-L6-v2 ONNX directory (default: Chroma's cache)")
+    parser.add_argument("--quantize", action="store_true", help="Also write an int8 model for EMBEDDING_MODEL_QUANTIZED")
+    parser.add_argument("--version", default="1", help="Version recorded in the manifest")
+    args = parser.parse_args()
+
+    source = args.source or default_source()
+    os.makedirs(args.dest, exist_ok=True)
+    for name in REQUIRED_FILES:
+        shutil.copy2(os.path.join(source, name), os.path.join(args.dest, name))
+    if args.quantize:
+        quantize(args.dest)
+
+    files = sorted(name for name in os.listdir(args.dest) if name != MANIFEST_FILE)
+    manifest = {
+        "model": ONNXMiniLM_L6_V2.MODEL_NAME,
+        "version": args.version,
+        "files": {name: sha256(os.path.join(args.dest, name)) for name in files}
+    }
+    with open(os.path.join(args.dest, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    check_reopens_default_store(args.dest)
+    for name in files:
+        print(f"{name:28} {os.path.getsize(os.path.join(args.dest, name)) / 1e6:8.2f} MB")
+    print(f"Wrote {ONNXMiniLM_L6_V2.MODEL_NAME} v{args.version} to {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
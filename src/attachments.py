@@ -0,0 +1,177 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from src.output_capture import PRUNE_INTERVAL, prune_files
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_DIR = os.environ.get("ATTACHMENT_DIR", os.path.join(tempfile.gettempdir(), "toolboxai_attachments"))
+ATTACHMENT_CACHE_BYTES = int(os.environ.get("ATTACHMENT_CACHE_BYTES", 64 * 1024 * 1024))
+# Attachments unused for this many hours are deleted, and least recently used first beyond this total size.
+ATTACHMENT_MAX_AGE_HOURS = float(os.environ.get("ATTACHMENT_MAX_AGE_HOURS", 24))
+ATTACHMENT_MAX_TOTAL_BYTES = int(os.environ.get("ATTACHMENT_MAX_TOTAL_BYTES", 1024 * 1024 * 1024))
+THUMBNAIL_SIZE = (300, 300)
+
+
+class AttachmentStore:
+    """
+    Content-addressed store for uploaded files.
+
+    Bytes are written once to disk under their SHA-256 digest and kept in a
+    size-bounded LRU cache, so chat history only needs to hold the digest.
+    Identical uploads, in any session, share one copy. Files are touched
+    whenever they are used and pruned like tool output artifacts: after
+    max_age_hours unused, and least recently used first beyond
+    max_total_bytes.
+    """
+
+    def __init__(self, root=ATTACHMENT_DIR, max_cache_bytes=ATTACHMENT_CACHE_BYTES,
+                 max_age_hours=ATTACHMENT_MAX_AGE_HOURS, max_total_bytes=ATTACHMENT_MAX_TOTAL_BYTES):
+        self.root = root
+        self.max_cache_bytes = max_cache_bytes
+        self.max_age_hours = max_age_hours
+        self.max_total_bytes = max_total_bytes
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._last_prune = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, data):
+        self.prune()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            self._touch(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._remember(digest, data)
+        return digest
+
+    def get(self, digest):
+        path = self._path(digest)
+        with self._lock:
+            data = self._cache.get(digest)
+            if data is not None:
+                self._cache.move_to_end(digest)
+                self._touch(path)
+                return data
+        with open(path, "rb") as f:
+            data = f.read()
+        self._touch(path)
+        self._remember(digest, data)
+        return data
+
+    def size(self, digest):
+        return os.path.getsize(self._path(digest))
+
+    def get_thumbnail(self, digest, size=THUMBNAIL_SIZE):
+        key = f"{digest}:thumb:{size[0]}x{size[1]}"
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                return data
+        try:
+            image = Image.open(io.BytesIO(self.get(digest)))
+            image.thumbnail(size)
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            data = buffer.getvalue()
+        except Exception as e:
+            logger.warning(f"Could not build thumbnail for {digest}: {e}")
+            data = self.get(digest)
+        self._remember(key, data)
+        return data
+
+    def prune(self, force=False):
+        """Delete attachments unused for max_age_hours, then the least recently used beyond max_total_bytes."""
+        with self._prune_lock:
+            now = time.time()
+            if not force and now - self._last_prune < PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+            files = []
+            for directory in os.scandir(self.root):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    if not entry.name.endswith(".tmp") and entry.is_file():
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+            prune_files(files, self.max_age_hours, self.max_total_bytes, now)
+
+    @staticmethod
+    def _touch(path):
+        # Ages are counted from last use, so attachments still in a chat's history are kept.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _remember(self, key, data):
+        if len(data) > self.max_cache_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return
+            self._cache[key] = data
+            self._cache_bytes += len(data)
+            while self._cache_bytes > self.max_cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+
+def materialize_attachments(messages):
+    """
+    Return messages ready for Bedrock, with attachment references replaced by bytes.
+
+    History stores image/document sources as {"attachment": digest}; only
+    the messages that contain such references are copied.
+    """
+    materialized = []
+    for message in messages:
+        if not any(_attachment_block(block) for block in message["content"]):
+            materialized.append(message)
+            continue
+        content = []
+        for block in message["content"]:
+            kind = _attachment_block(block)
+            if kind:
+                try:
+                    source = {"bytes": attachment_store.get(block[kind]["source"]["attachment"])}
+                except FileNotFoundError:
+                    # Pruned from disk since it was uploaded.
+                    name = block[kind].get("name", kind)
+                    block = {"text": f"[The attached {name} is no longer available.]"}
+                else:
+                    block = {kind: {**block[kind], "source": source}}
+            content.append(block)
+        materialized.append({**message, "content": content})
+    return materialized
+
+def _attachment_block(block):
+    for kind in ("image", "document"):
+        if kind in block and "attachment" in block[kind].get("source", {}):
+            return kind
+    return None
+
+
+attachment_store = AttachmentStore()
@@ -1,7 +1,52 @@
+import os
+import threading
+
 import boto3
+from botocore.config import Config
+
+# Sized for the number of concurrent Streamlit sessions (and tool threads) that
+# share one process; botocore's default of 10 serializes requests beyond that.
+MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", 50))
+MAX_RETRY_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_RETRY_ATTEMPTS", 5))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _client_config(**overrides):
+    options = {
+        "max_pool_connections": MAX_POOL_CONNECTIONS,
+        "tcp_keepalive": True,
+        "retries": {"max_attempts": MAX_RETRY_ATTEMPTS, "mode": "adaptive"},
+    }
+    options.update(overrides)
+    return Config(**options)
+
+def get_client(service_name, region, **config_overrides):
+    """
+    Return a process-wide boto3 client for (service, region, config).
+
+    Clients are thread-safe, so one instance (and its connection pool and
+    resolved credentials) is shared by every session instead of being rebuilt
+    on each Streamlit rerun.
+    """
+    key = (service_name, region, repr(sorted(config_overrides.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                # boto3's default session is not thread-safe, so client creation
+                # stays under the lock.
+                client = boto3.client(
+                    service_name=service_name,
+                    region_name=region,
+                    config=_client_config(**config_overrides)
+                )
+                _clients[key] = client
+    return client
 
 def create_bedrock_client(region):
-    return boto3.client(service_name='bedrock-runtime', region_name=region)
+    return get_client('bedrock-runtime', region)
 
 def get_stream(bedrock_client, model_id, messages, system_prompts, inference_config, additional_model_fields, toolConfig):
     response = bedrock_client.converse_stream(
@@ -0,0 +1,19 @@
+import contextvars
+import uuid
+
+# The chat that tool calls belong to. main.py sets it on every rerun, and
+# submit_tool_call copies it into the tool thread, so per-chat state such as
+# Python sessions can be looked up without passing ids through tool inputs.
+current_chat_id = contextvars.ContextVar("chat_id", default=None)
+
+
+def new_chat_id():
+    return uuid.uuid4().hex
+
+
+def set_current_chat(chat_id):
+    current_chat_id.set(chat_id)
+
+
+def get_current_chat():
+    return current_chat_id.get()
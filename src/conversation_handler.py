@@ -2,12 +2,15 @@ import streamlit as st
 import json
 from botocore.exceptions import ClientError
 from src.bedrock_client import get_stream, stream_conversation
-from src.utils import handle_chat_output, handle_tool_use, format_memory_results
-from src.tools import process_tool_call
+from src.utils import handle_chat_output, handle_tool_use, format_memory_results, ThrottledPlaceholder, RENDER_INTERVAL
+from src.tools import submit_tool_call, tool_call_order_key
+from src.stream_parser import TagStreamParser
+from src.attachments import attachment_store, materialize_attachments
+from src.history_manager import fit_history
+from src.output_capture import ToolProgress
+from concurrent.futures import wait
 import os
-import base64
 import logging
-import re
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
@@ -21,18 +24,19 @@ def handle_chat_input(prompt, file_content=None, file_name=None):
     if file_content and file_name:
         name, ext = os.path.splitext(file_name)
         file_format = ext.lstrip('.').lower()
+        # History only keeps a reference; bytes are loaded when the request is built.
+        attachment_id = attachment_store.put(file_content)
         
         if file_format in ["png", "jpg", "jpeg", "webp"]:
             user_message["content"].append({
                 "image": {
                     "format": file_format,
                     "source": {
-                        "bytes": file_content
+                        "attachment": attachment_id
                     }
                 }
             })
-            file_b64 = base64.b64encode(file_content).decode()
-            display_message["image"] = f"data:image/{file_format};base64,{file_b64}"
+            display_message["image"] = attachment_id
             logger.debug(f"Processed image file: {file_name}")
         else:
             document_formats = ["pdf", "csv", "doc", "docx", "xls", "xlsx", "html", "txt", "md"]
@@ -44,7 +48,7 @@ def handle_chat_input(prompt, file_content=None, file_name=None):
                     "name": name,
                     "format": file_format,
                     "source": {
-                        "bytes": file_content
+                        "attachment": attachment_id
                     }
                 }
             })
@@ -61,28 +65,25 @@ def handle_chat_input(prompt, file_content=None, file_name=None):
 def process_ai_response(bedrock_client, model_id, messages, system_prompts, inference_config, additional_model_fields, dynamic_tool_config):
     logger.debug("Starting AI response processing")
     turn_token_usage = {'inputTokens': 0, 'outputTokens': 0, 'totalTokens': 0}
+    st.session_state.turn_history_tokens_saved = 0
     
     while True:
         with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            tool_input_placeholder = st.empty()
-            full_response = ""
-            thinking_content = ""
-            answer_content = ""
+            message_placeholder = ThrottledPlaceholder(st.empty())
+            tool_input_placeholder = ThrottledPlaceholder(st.empty())
+            parser = TagStreamParser()
             clean_answer = ""
-            is_thinking = False
-            is_answering = False
-            full_tool_input = ""
-            tool_name = None
-            tool_id = None
-            is_tool_use = False
+            tool_blocks = {}
             assistant_message = {"role": "assistant", "content": []}
 
             try:
+                request_messages, tokens_saved = fit_history(messages, model_id)
+                st.session_state.history_tokens_saved = st.session_state.get("history_tokens_saved", 0) + tokens_saved
+                st.session_state.turn_history_tokens_saved += tokens_saved
                 stream = get_stream(
                     bedrock_client, 
                     model_id, 
-                    messages, 
+                    materialize_attachments(request_messages), 
                     system_prompts, 
                     inference_config, 
                     additional_model_fields,
@@ -94,116 +95,105 @@ def process_ai_response(bedrock_client, model_id, messages, system_prompts, infe
                     if 'contentBlockStart' in event:
                         start = event['contentBlockStart']['start']
                         if 'toolUse' in start:
-                            is_tool_use = True
                             tool_use = start['toolUse']
-                            tool_id = tool_use['toolUseId']
-                            tool_name = tool_use['name']
-                            # # This is where the output is changing the display messages
-                            # st.markdown(f"Using tool: {tool_name}")
-                            logger.debug(f"Tool use started: {tool_name}")
+                            tool_blocks[event['contentBlockStart'].get('contentBlockIndex')] = {
+                                "toolUseId": tool_use['toolUseId'],
+                                "name": tool_use['name'],
+                                "input": ""
+                            }
+                            logger.debug(f"Tool use started: {tool_use['name']}")
 
                     if 'contentBlockDelta' in event:
                         delta = event['contentBlockDelta']['delta']
-                        
-                        if 'text' in delta and not is_tool_use:
-                            text_chunk = delta['text']
-                            full_response += text_chunk
-                            
-                            if '<thinking' in text_chunk:
-                                is_thinking = True
-                                is_answering = False
-                            elif '<answer' in text_chunk:
-                                is_thinking = False
-                                is_answering = True
-                                answer_content = ""
-                            elif '</answer' in text_chunk:
-                                is_answering = False
-                            else:
-                                if text_chunk != ">":
-                                    is_answering = True
-                            
-                            if is_thinking:
-                                thinking_content += text_chunk
-                            elif is_answering:
-                                answer_content += text_chunk
-                                
-                                clean_answer = re.sub(r'<answer>|</answer>', '', answer_content).strip()
-                                message_placeholder.markdown(clean_answer)
-                                logger.debug(f"Assistant response: {clean_answer}")
-    
-                        elif 'toolUse' in delta and is_tool_use:
-                            full_tool_input = handle_tool_use(delta, tool_input_placeholder, full_tool_input, False)
-                            logger.debug(f"Tool input: {full_tool_input}")
+                        block_index = event['contentBlockDelta'].get('contentBlockIndex')
+
+                        if 'text' in delta and not tool_blocks:
+                            if parser.feed(delta['text']):
+                                message_placeholder.markdown(lambda: parser.answer)
+
+                        elif 'toolUse' in delta and block_index in tool_blocks:
+                            tool_block = tool_blocks[block_index]
+                            tool_block["input"] = handle_tool_use(delta, tool_input_placeholder, tool_block["input"], False)
+
+                    elif 'contentBlockStop' in event:
+                        message_placeholder.flush()
+                        tool_input_placeholder.flush()
+                        tool_block = tool_blocks.get(event['contentBlockStop'].get('contentBlockIndex'))
+                        if tool_block:
+                            # Start the tool as soon as its input is complete so it
+                            # overlaps with the rest of the stream.
+                            tool_block["input_json"] = parse_tool_input(tool_block["input"])
+                            if "error" not in tool_block["input_json"]:
+                                dispatch_tool_call(tool_block, tool_block["input_json"], tool_blocks)
+                                logger.debug(f"Tool dispatched early: {tool_block['name']}")
 
                     elif 'messageStop' in event:
+                        if parser.flush():
+                            message_placeholder.markdown(parser.answer)
+                        message_placeholder.flush()
+                        clean_answer = parser.answer
+                        logger.debug(f"Assistant response: {clean_answer}")
                         if event['messageStop'].get('stopReason') == 'tool_use':
                             if clean_answer:
                                 assistant_message["content"].append({"text": clean_answer})
                                 update_display_messages("assistant", clean_answer)
                                 logger.debug(f"Assistant message appended: {clean_answer}")
                             
-                            tool_input_json = {}
-                            if full_tool_input:
-                                try:
-                                    tool_input_json = json.loads(full_tool_input)
-                                except json.JSONDecodeError as e:
-                                    logger.error(f"Error parsing tool input JSON: {e}")
-                                    logger.error(f"Full tool input: {full_tool_input}")
-                                    tool_input_json = {"error": "Invalid JSON input"}
-                            
-                            assistant_message["content"].append({
-                                "toolUse": {
-                                    "toolUseId": tool_id,
-                                    "name": tool_name,
-                                    "input": tool_input_json
-                                }
-                            })
-                            tool_input_placeholder.markdown(f"Tool input: {full_tool_input}")
-
-                            try:
-                                tool_results = process_tool_call(tool_name, tool_input_json)
-                                tool_results_json = json.loads(tool_results)
-                            except json.JSONDecodeError as e:
-                                logger.error(f"Error decoding tool results JSON: {e}")
-                                tool_results_json = {"error": "Invalid tool results format"}
-
-                            with st.expander(f"🔍 Tool Results: {tool_name}", expanded=False):
-                                if "error" in tool_results_json:
-                                    st.error(tool_results_json["error"])
-                                else:
-                                    if tool_name in ["save_memory", "recall_memories", "update_memory", "delete_memory", "get_user_profile", "list_all_memories"]:
-                                        st.markdown(format_memory_results(tool_results_json["result"]))
-                                    else:
-                                        st.json(tool_results_json["result"])
+                            tool_calls = []
+                            for tool_block in tool_blocks.values():
+                                tool_input_json = tool_block.get("input_json")
+                                if tool_input_json is None:
+                                    tool_input_json = parse_tool_input(tool_block["input"])
+                                assistant_message["content"].append({
+                                    "toolUse": {
+                                        "toolUseId": tool_block["toolUseId"],
+                                        "name": tool_block["name"],
+                                        "input": tool_input_json
+                                    }
+                                })
+                                if "future" not in tool_block:
+                                    dispatch_tool_call(tool_block, tool_input_json, tool_blocks)
+                                future = tool_block["future"]
+                                tool_calls.append((tool_block, future))
+
+                            tool_input_placeholder.markdown("Tool input: " + "\n\n".join(
+                                f"{tool_block['name']}: {tool_block['input']}" for tool_block, _ in tool_calls
+                            ))
+                            tool_input_placeholder.flush()
+
+                            # The calls above already run concurrently (most were started
+                            # at contentBlockStop); results are collected in block order
+                            # and returned in one message.
+                            tool_result_blocks = []
+                            for tool_block, future in tool_calls:
+                                tool_results = collect_tool_result(tool_block, future)
+                                tool_result_blocks.append({
+                                    "toolResult": {
+                                        "toolUseId": tool_block["toolUseId"],
+                                        "content": [
+                                            {"text": str(tool_results)}
+                                        ]
+                                    }
+                                })
+                                logger.debug(f"Tool results processed: {tool_results}")
 
                             messages.append(assistant_message)
                             messages.append({
                                 "role": "user",
-                                "content": [
-                                    {
-                                        "toolResult": {
-                                            "toolUseId": tool_id,
-                                            "content": [
-                                                {"text": str(tool_results)}
-                                            ]
-                                        }
-                                    }
-                                ]
+                                "content": tool_result_blocks
                             })
 
-                            update_display_messages("tool", f"Tool used: {tool_name}", tool_name, full_tool_input, tool_results)
-                            logger.debug(f"Tool results processed: {tool_results}")
-
                             tool_input_placeholder.empty()
-                            is_tool_use = False
-                            full_tool_input = ""
-                            full_response = ""
+                            tool_blocks = {}
                             assistant_message = {"role": "assistant", "content": []}
                         else:
                             if clean_answer:
                                 assistant_message["content"].append({"text": clean_answer})
                                 update_display_messages("assistant", clean_answer)
                                 logger.debug(f"Final assistant message: {clean_answer}")
+                            # Tools started early have already run; keep what they did in the history.
+                            for note in collect_started_tools(tool_blocks, event['messageStop'].get('stopReason')):
+                                assistant_message["content"].append({"text": note})
                             messages.append(assistant_message)
 
                     if 'metadata' in event:
@@ -221,16 +211,99 @@ def process_ai_response(bedrock_client, model_id, messages, system_prompts, infe
                 message = err.response['Error']['Message']
                 st.error(f"A client error occurred: {message}")
                 logger.error(f"A client error occurred: {message}")
+                collect_started_tools(tool_blocks, "error")
                 st.stop()
                 return
             except Exception as e:
                 st.error(f"An unexpected error occurred: {str(e)}")
                 logger.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+                collect_started_tools(tool_blocks, "error")
                 st.stop()
                 return
 
     return turn_token_usage
 
+def parse_tool_input(raw_input):
+    if not raw_input:
+        return {}
+    try:
+        return json.loads(raw_input)
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing tool input JSON: {e}")
+        logger.error(f"Full tool input: {raw_input}")
+        return {"error": "Invalid JSON input"}
+
+def dispatch_tool_call(tool_block, tool_input, tool_blocks):
+    """
+    Submit a tool block's call, with a ToolProgress for its live output.
+
+    Calls that share per-chat state (see tool_call_order_key) start only
+    after the previous such call in this message finishes, so e.g. a `cd`
+    runs before the command that relies on it; other calls run in parallel.
+    """
+    tool_block["order_key"] = tool_call_order_key(tool_block["name"], tool_input)
+    after = None
+    if tool_block["order_key"]:
+        for other in tool_blocks.values():
+            if other is not tool_block and other.get("order_key") == tool_block["order_key"] and "future" in other:
+                after = other["future"]
+    tool_block["progress"] = ToolProgress()
+    tool_block["future"] = submit_tool_call(tool_block["name"], tool_input, tool_block["progress"], after)
+
+def wait_for_tool_result(tool_name, future, progress):
+    """Wait for a tool call, showing the output it streams (if any) in an expander until it finishes."""
+    live = st.empty()
+    output_placeholder = None
+    shown = ""
+    while not future.done():
+        text = progress.getvalue()
+        if text != shown:
+            if output_placeholder is None:
+                output_placeholder = live.container().expander(f"⏳ Running: {tool_name}", expanded=True).empty()
+            output_placeholder.code(text)
+            shown = text
+        wait([future], timeout=RENDER_INTERVAL)
+    live.empty()
+    return future.result()
+
+def collect_tool_result(tool_block, future):
+    """Wait for a dispatched tool call and show its result."""
+    tool_name = tool_block["name"]
+    tool_results = wait_for_tool_result(tool_name, future, tool_block["progress"])
+    if tool_name == "update_user_profile":
+        # Drop the profile cached by prefetch so the next turn sees the update.
+        st.session_state.pop("user_profile", None)
+    display_tool_results(tool_name, tool_results)
+    update_display_messages("tool", f"Tool used: {tool_name}", tool_name, tool_block["input"], tool_results)
+    return tool_results
+
+def collect_started_tools(tool_blocks, stop_reason):
+    """Wait for tools dispatched early in a turn that ended without tool_use; return a note on each for the history."""
+    notes = []
+    for tool_block in tool_blocks.values():
+        if "future" not in tool_block:
+            continue
+        tool_results = collect_tool_result(tool_block, tool_block["future"])
+        logger.warning(f"Tool {tool_block['name']} ran but the turn ended ({stop_reason}) before its result was returned: {tool_results}")
+        notes.append(f"[{tool_block['name']} ran with input {tool_block['input']} but the response ended ({stop_reason}) before its result was returned: {tool_results}]")
+    return notes
+
+def display_tool_results(tool_name, tool_results):
+    try:
+        tool_results_json = json.loads(tool_results)
+    except json.JSONDecodeError as e:
+        logger.error(f"Error decoding tool results JSON: {e}")
+        tool_results_json = {"error": "Invalid tool results format"}
+
+    with st.expander(f"🔍 Tool Results: {tool_name}", expanded=False):
+        if "error" in tool_results_json:
+            st.error(tool_results_json["error"])
+        else:
+            if tool_name in ["save_memory", "save_memories", "recall_memories", "recall_memories_batch", "update_memory", "delete_memory", "get_user_profile", "list_all_memories"]:
+                st.markdown(format_memory_results(tool_results_json["result"]))
+            else:
+                st.json(tool_results_json["result"])
+
 def update_display_messages(role, content, tool_name=None, tool_input=None, tool_results=None):
     message = {
         "role": role,
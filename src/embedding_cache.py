@@ -0,0 +1,112 @@
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 20000))
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of text embeddings keyed by (model, normalized text).
+
+    Lookups hit an in-memory LRU first and then an optional SQLite file, and
+    only the remaining misses are sent to the embedding function, in a
+    single batch. Text is normalized by collapsing whitespace, which does not
+    change what the tokenizer sees.
+    """
+
+    def __init__(self, model_name, db_path=None, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text TEXT, vector BLOB, PRIMARY KEY (model, text))")
+            self._db.commit()
+
+    def embed(self, texts, embedding_function):
+        keys = [self.normalize(text) for text in texts]
+        vectors = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[i] = vector
+                    self._counters["hits"] += 1
+
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing and self._db is not None:
+                for i, vector in zip(missing, self._read_disk([keys[i] for i in missing])):
+                    if vector is not None:
+                        vectors[i] = vector
+                        self._remember(keys[i], vector)
+                        self._counters["disk_hits"] += 1
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Embed each distinct missing text once.
+            unique_keys = list(dict.fromkeys(keys[i] for i in missing))
+            computed = dict(zip(unique_keys, (np.asarray(v, dtype=np.float32) for v in embedding_function(unique_keys))))
+            with self._lock:
+                self._counters["misses"] += len(missing)
+                for key, vector in computed.items():
+                    self._remember(key, vector)
+                self._write_disk(computed)
+            for i in missing:
+                vectors[i] = computed[keys[i]]
+        return vectors
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["entries"] = len(self._entries)
+        lookups = counters["hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = (counters["hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+        return counters
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.split())
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, keys):
+        found = {}
+        # Stay under SQLite's limit on bound parameters per statement.
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._db.execute(
+                f"SELECT text, vector FROM embeddings WHERE model = ? AND text IN ({placeholders})",
+                [self.model_name, *chunk]
+            ).fetchall()
+            found.update((text, np.frombuffer(blob, dtype=np.float32)) for text, blob in rows)
+        return [found.get(key) for key in keys]
+
+    def _write_disk(self, computed):
+        if self._db is None:
+            return
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                [(self.model_name, key, vector.tobytes()) for key, vector in computed.items()]
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist embeddings: {e}")
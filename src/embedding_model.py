@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+from functools import cached_property
+
+import numpy as np
+
+from chromadb.utils import embedding_functions
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+logger = logging.getLogger(__name__)
+
+# Directory holding a vendored copy of the embedding model (see scripts/vendor_embedding_model.py).
+# When unset, Chroma's default model is used and downloaded on first use.
+EMBEDDING_MODEL_PATH = os.environ.get("EMBEDDING_MODEL_PATH")
+# Run the int8 dynamically quantized model.int8.onnx instead of model.onnx.
+EMBEDDING_MODEL_QUANTIZED = os.environ.get("EMBEDDING_MODEL_QUANTIZED", "").lower() in ("1", "true", "yes")
+# ONNX Runtime intra-op threads (0 lets ONNX Runtime decide).
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", 0))
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+MANIFEST_FILE = "manifest.json"
+REQUIRED_FILES = ["model.onnx", "tokenizer.json", "config.json", "special_tokens_map.json", "tokenizer_config.json", "vocab.txt"]
+
+
+class LocalOnnxEmbeddingFunction(ONNXMiniLM_L6_V2):
+    """
+    all-MiniLM-L6-v2 loaded from a local, versioned directory instead of Chroma's download cache.
+
+    Never touches the network: a missing file raises at load time. Batches
+    are padded to their longest text rather than to the model's 256-token
+    limit, which gives the same embeddings (padding is masked out of both
+    attention and pooling) for much less compute on short memories. With
+    quantized=True the int8 model written by the vendoring script is run on
+    the CPU provider.
+
+    It is the same model as Chroma's DefaultEmbeddingFunction, so name(),
+    get_config() and default_space() report that function's values: stores
+    created with the default reopen with this one and vice versa. model_id
+    identifies the version and precision, for caches keyed by model.
+
+    Texts are truncated to the model's 256-token limit without error: words
+    past it do not affect the embedding (a warning is logged per batch).
+    This subclass overrides private parts of Chroma's ONNX embedding function,
+    which is why requirements.txt pins chromadb to the tested range.
+    """
+
+    EXTRACTED_FOLDER_NAME = ""
+
+    def __init__(self, model_dir, quantized=False, threads=EMBEDDING_THREADS):
+        super().__init__(preferred_providers=["CPUExecutionProvider"])
+        self.DOWNLOAD_PATH = model_dir
+        self.quantized = quantized
+        self.threads = threads
+        self.manifest = self._read_manifest()
+        precision = "int8" if quantized else "fp32"
+        self.model_id = f"{self.manifest.get('model', self.MODEL_NAME)}@{self.manifest.get('version', 'unversioned')}:{precision}"
+
+    @staticmethod
+    def name():
+        return embedding_functions.DefaultEmbeddingFunction.name()
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return create_embedding_function()
+
+    @staticmethod
+    def validate_config(config):
+        return
+
+    def default_space(self):
+        return embedding_functions.DefaultEmbeddingFunction().default_space()
+
+    def _read_manifest(self):
+        path = os.path.join(self.DOWNLOAD_PATH, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _download_model_if_not_exists(self):
+        files = REQUIRED_FILES + ([QUANTIZED_MODEL_FILE] if self.quantized else [])
+        missing = [name for name in files if not os.path.exists(os.path.join(self.DOWNLOAD_PATH, name))]
+        if missing:
+            raise FileNotFoundError(
+                f"Embedding model at {self.DOWNLOAD_PATH} is missing {missing}; "
+                "run scripts/vendor_embedding_model.py to build it."
+            )
+
+    @cached_property
+    def tokenizer(self):
+        tokenizer = self.Tokenizer.from_file(os.path.join(self.DOWNLOAD_PATH, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=256)
+        tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        return tokenizer
+
+    @cached_property
+    def model(self):
+        options = self.ort.SessionOptions()
+        options.log_severity_level = 3
+        options.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        model_file = QUANTIZED_MODEL_FILE if self.quantized else MODEL_FILE
+        return self.ort.InferenceSession(
+            os.path.join(self.DOWNLOAD_PATH, model_file),
+            providers=self._preferred_providers,
+            sess_options=options
+        )
+
+    def _forward(self, documents, batch_size=32):
+        # Sorting by length keeps similarly sized texts in a batch, so little is padded.
+        order = sorted(range(len(documents)), key=lambda i: len(documents[i]))
+        embeddings = np.empty((len(documents), 0), dtype=np.float32)
+        for start in range(0, len(documents), batch_size):
+            rows = order[start:start + batch_size]
+            encoded = self.tokenizer.encode_batch([documents[i] for i in rows])
+            truncated = sum(1 for e in encoded if e.overflowing)
+            if truncated:
+                logger.warning(f"{truncated} text(s) exceeded 256 tokens and were truncated before embedding")
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            last_hidden_state = self.model.run(None, {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids)
+            })[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if embeddings.shape[1] == 0:
+                embeddings = np.empty((len(documents), pooled.shape[1]), dtype=np.float32)
+            embeddings[rows] = self._normalize(pooled)
+        return embeddings
+
+
+def create_embedding_function(model_dir=EMBEDDING_MODEL_PATH, quantized=EMBEDDING_MODEL_QUANTIZED):
+    """Return the memory store's embedding function: the vendored model if configured, else Chroma's default."""
+    if model_dir:
+        logger.info(f"Using local embedding model at {model_dir} ({'int8' if quantized else 'fp32'})")
+        return LocalOnnxEmbeddingFunction(model_dir, quantized=quantized)
+    return embedding_functions.DefaultEmbeddingFunction()
@@ -1,7 +1,7 @@
 # additional_tools.py
 
 import yfinance as yf
-import requests
+from src.http_client import http_get
 
 def get_stock_price(ticker):
     stock = yf.Ticker(ticker)
@@ -14,12 +14,13 @@ def calculate_roi(initial_investment, final_value):
 
 def market_sentiment_analysis(keyword):
     url = f"https://api.example.com/sentiment?query={keyword}"
-    response = requests.get(url)
+    response = http_get(url, tool="market_sentiment_analysis")
     if response.status_code == 200:
         sentiment = response.json()
         return format_sentiment(sentiment)
     else:
-        return "Error: Unable to perform sentiment analysis."
+        # Raise rather than return an error string, so the tool cache doesn't keep the failure.
+        raise Exception(f"Unable to perform sentiment analysis (HTTP {response.status_code}).")
 
 def format_sentiment(sentiment):
     return f"Market Sentiment: {sentiment['score']} ({sentiment['mood']})"
@@ -37,12 +38,12 @@ def simulate_trade(platform, asset, amount, action):
 
 def explain_financial_term(term):
     url = f"https://api.example.com/define?term={term}"
-    response = requests.get(url)
+    response = http_get(url, tool="explain_financial_term")
     if response.status_code == 200:
         definition = response.json()
         return f"Definition of {term}: {definition['description']}"
     else:
-        return "Error: Unable to retrieve definition."
+        raise Exception(f"Unable to retrieve definition (HTTP {response.status_code}).")
 
 def compare_financial_apps(app1, app2, feature):
     # Simulate app comparison
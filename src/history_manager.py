@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+
+from src.attachments import attachment_store
+
+logger = logging.getLogger(__name__)
+
+# Input-token budget for the conversation history sent with each request (the
+# system prompt and tool definitions come on top of this).
+DEFAULT_HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 60000))
+MODEL_HISTORY_TOKEN_BUDGETS = {
+    "anthropic.claude-3-haiku-20240307-v1:0": 40000,
+    "anthropic.claude-3-sonnet-20240229-v1:0": 60000,
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": 60000,
+    "anthropic.claude-3-opus-20240229-v1:0": 30000,
+}
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 1600
+COMPACT_TOOL_RESULT_CHARS = 600
+SUMMARY_SNIPPET_CHARS = 200
+MAX_SUMMARY_CHARS = 4000
+
+
+def estimate_tokens(message):
+    """Rough token estimate for one Converse message (~4 characters per token)."""
+    chars = 0
+    tokens = 0
+    for block in message["content"]:
+        if "text" in block:
+            chars += len(block["text"])
+        elif "toolUse" in block:
+            chars += len(json.dumps(block["toolUse"].get("input", {})))
+        elif "toolResult" in block:
+            chars += sum(len(item.get("text", "")) for item in block["toolResult"]["content"])
+        elif "image" in block:
+            tokens += IMAGE_TOKENS
+        elif "document" in block:
+            source = block["document"]["source"]
+            if "attachment" in source:
+                chars += attachment_store.size(source["attachment"])
+            else:
+                chars += len(source.get("bytes", b""))
+    return tokens + chars // CHARS_PER_TOKEN
+
+
+def fit_history(messages, model_id):
+    """
+    Return (request_messages, tokens_saved) for a history that fits the model's budget.
+
+    The latest exchange is always sent as-is. Older tool results are cut down
+    and older attachments replaced by a placeholder first; if that is still
+    over budget, the oldest exchanges are dropped and folded into a short
+    summary prepended to the first remaining user message. Exchanges are only
+    dropped whole, so every toolUse keeps its matching toolResult. The stored
+    history itself is never modified.
+    """
+    budget = MODEL_HISTORY_TOKEN_BUDGETS.get(model_id, DEFAULT_HISTORY_TOKEN_BUDGET)
+    original_tokens = sum(estimate_tokens(message) for message in messages)
+    if original_tokens <= budget:
+        return messages, 0
+
+    exchanges = _split_exchanges(messages)
+    latest = exchanges[-1:]
+    older = [[_compact_message(message) for message in exchange] for exchange in exchanges[:-1]]
+
+    total = sum(estimate_tokens(message) for exchange in older + latest for message in exchange)
+    dropped = []
+    while older and total > budget:
+        total -= sum(estimate_tokens(message) for message in older.pop(0))
+        dropped.append(exchanges[len(dropped)])
+
+    kept = [message for exchange in older + latest for message in exchange]
+    if dropped:
+        summary = _summarize(dropped)
+        first = kept[0]
+        kept[0] = {**first, "content": [{"text": summary}] + first["content"]}
+
+    sent_tokens = sum(estimate_tokens(message) for message in kept)
+    logger.info(f"History compacted from ~{original_tokens} to ~{sent_tokens} tokens ({len(dropped)} exchanges summarized)")
+    return kept, max(original_tokens - sent_tokens, 0)
+
+
+def _split_exchanges(messages):
+    """Group messages into exchanges that each start with a user text prompt."""
+    exchanges = []
+    for message in messages:
+        starts_exchange = message["role"] == "user" and not any("toolResult" in block for block in message["content"])
+        if starts_exchange or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(message)
+    return exchanges
+
+
+def _compact_message(message):
+    content = []
+    for block in message["content"]:
+        if "toolResult" in block:
+            text = "".join(item.get("text", "") for item in block["toolResult"]["content"])
+            if len(text) > COMPACT_TOOL_RESULT_CHARS:
+                text = f"{text[:COMPACT_TOOL_RESULT_CHARS]}... [older tool result truncated, {len(text)} chars total]"
+            block = {"toolResult": {**block["toolResult"], "content": [{"text": text}]}}
+        elif "image" in block:
+            block = {"text": "[An image was attached earlier in the conversation.]"}
+        elif "document" in block:
+            block = {"text": f"[Document '{block['document'].get('name', 'document')}' was attached earlier in the conversation.]"}
+        content.append(block)
+    return {**message, "content": content}
+
+
+def _summarize(exchanges):
+    lines = []
+    for exchange in exchanges:
+        for message in exchange:
+            for block in message["content"]:
+                if "text" in block:
+                    speaker = "User" if message["role"] == "user" else "Assistant"
+                    lines.append(f"- {speaker}: {_snippet(block['text'])}")
+                elif "toolUse" in block:
+                    lines.append(f"- Assistant used tool {block['toolUse']['name']}")
+    summary = "\n".join(lines)
+    if len(summary) > MAX_SUMMARY_CHARS:
+        summary = "...\n" + summary[-MAX_SUMMARY_CHARS:]
+    return f"[Summary of earlier conversation, compacted to save context]\n{summary}"
+
+
+def _snippet(text):
+    text = " ".join(text.split())
+    if len(text) > SUMMARY_SNIPPET_CHARS:
+        return text[:SUMMARY_SNIPPET_CHARS] + "..."
+    return text
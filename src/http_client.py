@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 20))
+MAX_RESPONSE_BYTES = int(os.environ.get("HTTP_MAX_RESPONSE_BYTES", 5 * 1024 * 1024))
+POOL_CONNECTIONS = 20  # number of hosts kept pooled
+POOL_MAXSIZE = 20      # connections kept alive per host
+USER_AGENT = "ToolboxAI/1.0 (+https://github.com/madtank/ToolboxAI)"
+
+_session = None
+_session_lock = threading.Lock()
+_stats = defaultdict(lambda: {"requests": 0, "failures": 0, "total_seconds": 0.0})
+_stats_lock = threading.Lock()
+
+class CappedResponse:
+    """
+    The parts of a requests.Response that tools use, with the body capped at max_bytes.
+
+    content, text and json() work as on a Response; truncated says whether
+    the body was cut.
+    """
+
+    def __init__(self, response, content, truncated):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = response.url
+        self.reason = response.reason
+        self.encoding = response.encoding
+        self.content = content
+        self.truncated = truncated
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} {self.reason} for url: {self.url}", response=self)
+
+def get_session():
+    """Return the process-wide pooled requests session used by all tools."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=["GET", "HEAD"],
+                    respect_retry_after_header=True,
+                    # Return the last error response rather than raising RetryError, so tools can check status_code.
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = USER_AGENT
+                _session = session
+    return _session
+
+def http_get(url, tool=None, timeout=None, max_bytes=MAX_RESPONSE_BYTES, **kwargs):
+    """
+    GET a URL through the shared session with timeouts, retries and a size cap.
+
+    The body is read incrementally and truncated at max_bytes, so one huge
+    page cannot exhaust memory; the result is a CappedResponse. Error
+    statuses are returned, not raised, once retries are used up. Latency and
+    failures are recorded under the given tool name (see get_http_stats).
+    """
+    started = time.monotonic()
+    failed = False
+    try:
+        response = get_session().get(
+            url,
+            timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
+            **kwargs
+        )
+        chunks = []
+        size = 0
+        truncated = False
+        with response:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    logger.warning(f"Response from {url} truncated at {max_bytes} bytes")
+                    truncated = True
+                    break
+        failed = response.status_code >= 400
+        return CappedResponse(response, b"".join(chunks)[:max_bytes], truncated)
+    except requests.RequestException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.monotonic() - started
+        with _stats_lock:
+            stats = _stats[tool or "http"]
+            stats["requests"] += 1
+            stats["total_seconds"] += elapsed
+            if failed:
+                stats["failures"] += 1
+        logger.info(f"HTTP GET {url} [{tool or 'http'}] took {elapsed:.2f}s{' (failed)' if failed else ''}")
+
+def get_http_stats():
+    """Per-tool request counts, failure counts and average latency."""
+    with _stats_lock:
+        return {
+            tool: {
+                "requests": stats["requests"],
+                "failures": stats["failures"],
+                "avg_seconds": stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+            }
+            for tool, stats in _stats.items()
+        }
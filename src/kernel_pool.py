@@ -0,0 +1,332 @@
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from src.session_registry import SessionRegistry, clamp_timeout
+
+logger = logging.getLogger(__name__)
+
+# Warm worker processes kept for execute_python_code (0 runs code in the server process).
+PYTHON_KERNEL_POOL_SIZE = int(os.environ.get("PYTHON_KERNEL_POOL_SIZE", 2))
+# Wall-clock seconds a snippet may run before its kernel is killed.
+PYTHON_KERNEL_TIMEOUT = float(os.environ.get("PYTHON_KERNEL_TIMEOUT", 30))
+# Upper bound on a timeout requested per call (the model cannot lift the limit past this).
+PYTHON_KERNEL_MAX_TIMEOUT = float(os.environ.get("PYTHON_KERNEL_MAX_TIMEOUT", 120))
+# Resident memory a kernel may reach before it is killed (0 for no limit).
+PYTHON_KERNEL_MEMORY_LIMIT_MB = int(os.environ.get("PYTHON_KERNEL_MEMORY_LIMIT_MB", 1024))
+# Kernels are replaced after this many executions, so leaked state and memory don't accumulate.
+PYTHON_KERNEL_MAX_EXECUTIONS = int(os.environ.get("PYTHON_KERNEL_MAX_EXECUTIONS", 50))
+# Modules imported once when kernels start, so snippets don't pay for them.
+PYTHON_KERNEL_PRELOAD = [name for name in os.environ.get("PYTHON_KERNEL_PRELOAD", "numpy,pandas").split(",") if name]
+# Persistent per-chat sessions are closed after this many idle seconds (0 keeps them until reset).
+PYTHON_SESSION_IDLE_TIMEOUT = float(os.environ.get("PYTHON_SESSION_IDLE_TIMEOUT", 900))
+# At most this many persistent sessions are kept; the least recently used idle one is closed first.
+PYTHON_SESSION_MAX = int(os.environ.get("PYTHON_SESSION_MAX", 8))
+
+START_TIMEOUT = 60  # seconds to wait for a new kernel to import its preloads
+POLL_INTERVAL = 0.05
+
+
+class KernelError(Exception):
+    """A kernel was killed (reason "timeout" or "memory") or died ("crash") while running a snippet."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class Kernel:
+    """One worker process that executes snippets sent over a pipe, in its own process group."""
+
+    def __init__(self, context, preload):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_kernel_main, args=(child_conn, preload), name="python-kernel")
+        self.process.start()
+        child_conn.close()
+        self.executions = 0
+
+    def wait_ready(self, timeout=START_TIMEOUT):
+        if not self.conn.poll(timeout):
+            raise KernelError("crash", f"Kernel did not start within {timeout}s")
+        self.conn.recv()
+
+    def run(self, code, timeout, memory_limit_bytes, persistent=False):
+        """Execute code in a fresh namespace, or in the kernel's persistent one."""
+        self.executions += 1
+        return self.request(("exec", code, persistent), timeout, memory_limit_bytes)
+
+    def request(self, message, timeout, memory_limit_bytes):
+        self.conn.send(message)
+        deadline = time.monotonic() + timeout
+        while not self.conn.poll(POLL_INTERVAL):
+            if not self.process.is_alive():
+                raise self._exited()
+            if memory_limit_bytes and self.rss_bytes() > memory_limit_bytes:
+                raise KernelError("memory", f"Memory limit of {memory_limit_bytes // (1024 * 1024)} MB exceeded")
+            if time.monotonic() > deadline:
+                raise KernelError("timeout", f"Execution timed out after {timeout:g}s")
+        try:
+            return self.conn.recv()
+        except EOFError:
+            raise self._exited()
+
+    def _exited(self):
+        self.process.join(1)
+        return KernelError("crash", f"Kernel exited with code {self.process.exitcode}")
+
+    def rss_bytes(self):
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return 0
+
+    def kill(self):
+        # Kill the whole process group, so subprocesses started by the snippet go too.
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (OSError, AttributeError):
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class PythonSession:
+    """A kernel pinned to one chat, whose namespace persists between calls."""
+
+    def __init__(self, kernel):
+        self.kernel = kernel
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class KernelPool:
+    """
+    Pool of warm Python worker processes for execute_python_code.
+
+    Up to size snippets run at once, each in a pre-started kernel that has
+    already imported the preload modules, so a call starts in milliseconds
+    and runaway code cannot block or crash the server process. A kernel is
+    killed when a call exceeds its wall-clock timeout or the kernel exceeds
+    the RSS limit, and is replaced after max_executions calls; replacements
+    are started in the background so the next call still finds a warm one.
+
+    A call with a session_id instead runs in that session's own kernel,
+    taken out of the pool on first use, whose variables persist until the
+    session is reset, goes idle for session_idle_timeout seconds or is the
+    least recently used of more than max_sessions. A new session is
+    refused while all max_sessions are running code.
+    """
+
+    def __init__(self, size=PYTHON_KERNEL_POOL_SIZE, preload=PYTHON_KERNEL_PRELOAD, timeout=PYTHON_KERNEL_TIMEOUT,
+                 max_timeout=PYTHON_KERNEL_MAX_TIMEOUT, memory_limit_mb=PYTHON_KERNEL_MEMORY_LIMIT_MB, max_executions=PYTHON_KERNEL_MAX_EXECUTIONS,
+                 session_idle_timeout=PYTHON_SESSION_IDLE_TIMEOUT, max_sessions=PYTHON_SESSION_MAX):
+        self.size = size
+        self.preload = preload
+        self.timeout = timeout
+        self.max_timeout = max(timeout, max_timeout)
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self.max_executions = max_executions
+        self.session_idle_timeout = session_idle_timeout
+        self.max_sessions = max_sessions
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Kernels fork from a server that has already imported these.
+            self._context.set_forkserver_preload(["src.python_repl"] + preload)
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.Queue()
+        self._closed = False
+        self._sessions = SessionRegistry(
+            lambda: PythonSession(self._take_kernel()), self._kill_session_kernel, max_sessions, session_idle_timeout,
+            name="python-session", on_evict=self._count_eviction
+        )
+        self.stats = {"executions": 0, "timeout": 0, "memory": 0, "crash": 0, "recycled": 0, "cold_starts": 0,
+                      "sessions_evicted": 0}
+        for _ in range(size):
+            self._replenish()
+
+    def execute(self, code, timeout=None, session_id=None):
+        """Run code in a kernel and return {"result", "output", "error"} like the in-process runner."""
+        if session_id:
+            return self._execute_in_session(code, timeout, session_id)
+        with self._slots:
+            kernel = self._acquire()
+            try:
+                response = kernel.run(code, self._call_timeout(timeout), self.memory_limit_bytes)
+            except KernelError as e:
+                self.stats[e.reason] += 1
+                kernel.kill()
+                self._replenish()
+                logger.warning(f"Python kernel {kernel.process.pid} killed: {e}")
+                return {"result": None, "output": "", "error": f"{e}. The Python kernel was restarted."}
+            self.stats["executions"] += 1
+            if kernel.executions >= self.max_executions or (
+                    self.memory_limit_bytes and kernel.rss_bytes() > self.memory_limit_bytes):
+                self.stats["recycled"] += 1
+                kernel.kill()
+                self._replenish()
+            else:
+                self._idle.put(kernel)
+            return response
+
+    def inspect_session(self, session_id):
+        """Return [{"name", "type", "preview"}] for the variables in a session, or None if it has none."""
+        session = self._sessions.lookup(session_id)
+        if session is None:
+            return None
+        with session.lock:
+            if not self._sessions.is_current(session_id, session):
+                return None
+            session.last_used = time.monotonic()
+            try:
+                return session.kernel.request(("inspect", None, True), self.timeout, self.memory_limit_bytes)
+            except KernelError as e:
+                self.stats[e.reason] += 1
+                self._sessions.remove(session_id, session)
+                return None
+
+    def close_session(self, session_id):
+        """Kill a session's kernel, discarding its variables. Returns False if there was no session."""
+        return self._sessions.discard(session_id)
+
+    def _execute_in_session(self, code, timeout, session_id):
+        while True:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return {"result": None, "output": "",
+                        "error": f"All {self.max_sessions} persistent Python sessions are busy. "
+                                 "Try again shortly, or run the code without persistent=true."}
+            with session.lock:
+                if not self._sessions.is_current(session_id, session):
+                    continue  # Closed while we waited for it; start a new one.
+                session.last_used = time.monotonic()
+                pid = session.kernel.process.pid
+                try:
+                    response = session.kernel.run(code, self._call_timeout(timeout), self.memory_limit_bytes,
+                                                  persistent=True)
+                except KernelError as e:
+                    self.stats[e.reason] += 1
+                    self._sessions.remove(session_id, session)
+                    logger.warning(f"Python session kernel {pid} killed: {e}")
+                    return {"result": None, "output": "",
+                            "error": f"{e}. The Python session was restarted and its variables were lost."}
+                self.stats["executions"] += 1
+                return response
+
+    def _call_timeout(self, timeout):
+        return clamp_timeout(timeout, self.timeout, self.max_timeout)
+
+    def _take_kernel(self):
+        # Sessions take a warm kernel out of the pool (which starts a replacement) rather than a slot.
+        try:
+            kernel = self._idle.get_nowait()
+        except queue.Empty:
+            kernel = None
+        else:
+            self._replenish()
+        if kernel is None:
+            self.stats["cold_starts"] += 1
+            kernel = Kernel(self._context, self.preload)
+            kernel.wait_ready()
+        return kernel
+
+    @staticmethod
+    def _kill_session_kernel(session):
+        if session.kernel is not None:
+            session.kernel.kill()
+            session.kernel = None
+
+    def _count_eviction(self):
+        self.stats["sessions_evicted"] += 1
+
+    def shutdown(self):
+        self._closed = True
+        self._sessions.close_all()
+        while True:
+            try:
+                kernel = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if kernel:
+                kernel.kill()
+
+    def _acquire(self):
+        # Holding a slot means a kernel is idle or being started for us. None marks a failed start.
+        try:
+            kernel = self._idle.get(timeout=START_TIMEOUT)
+        except queue.Empty:
+            kernel = None
+        if kernel is None:
+            self.stats["cold_starts"] += 1
+            kernel = Kernel(self._context, self.preload)
+            kernel.wait_ready()
+        return kernel
+
+    def _replenish(self):
+        threading.Thread(target=self._start_kernel, name="python-kernel-start", daemon=True).start()
+
+    def _start_kernel(self):
+        if self._closed:
+            return
+        try:
+            kernel = Kernel(self._context, self.preload)
+            kernel.wait_ready()
+        except Exception as e:
+            logger.error(f"Could not start Python kernel: {e}")
+            kernel = None
+        self._idle.put(kernel)
+
+
+def _kernel_main(conn, preload):
+    # Own process group, so kill() also reaches anything the snippet spawns.
+    os.setsid()
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    from src.python_repl import describe_namespace, run_code
+
+    session_globals = {}
+    conn.send("ready")
+    while True:
+        try:
+            op, code, persistent = conn.recv()
+        except EOFError:
+            break
+        if op == "inspect":
+            conn.send(describe_namespace(session_globals))
+            continue
+        response = run_code(code, session_globals if persistent else {})
+        try:
+            # The tool result is sent to the model as JSON.
+            json.dumps(response["result"])
+        except (TypeError, ValueError):
+            response["result"] = repr(response["result"])
+        conn.send(response)
+
+
+_kernel_pool = None
+_kernel_pool_lock = threading.Lock()
+
+def get_kernel_pool():
+    """Return the process-wide KernelPool, starting its kernels on first use."""
+    global _kernel_pool
+    if _kernel_pool is None:
+        with _kernel_pool_lock:
+            if _kernel_pool is None:
+                _kernel_pool = KernelPool()
+                atexit.register(_kernel_pool.shutdown)
+    return _kernel_pool
+
+def close_python_session(session_id):
+    """Discard a chat's persistent Python session, if the pool is running and it has one."""
+    if _kernel_pool is not None and session_id:
+        _kernel_pool.close_session(session_id)
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from src.vector_store import matches_where
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class KeywordIndex:
+    """
+    Inverted keyword index over memories, kept next to the vector collection.
+
+    Backed by an SQLite FTS5 table ranked with BM25, so exact terms such as
+    feed URLs, tickers and names can be found even when their embeddings are
+    not close to the query. Metadata is stored alongside each document so
+    that Chroma-style where filters can be applied to lexical hits too.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS memories USING fts5(memory_id UNINDEXED, document, metadata UNINDEXED)"
+        )
+        self._db.commit()
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM memories").fetchone()[0]
+
+    def add(self, ids, documents, metadatas):
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO memories (memory_id, document, metadata) VALUES (?, ?, ?)",
+                [(memory_id, document, json.dumps(metadata or {})) for memory_id, document, metadata in zip(ids, documents, metadatas)]
+            )
+            self._db.commit()
+
+    def update(self, memory_id, document, metadata):
+        with self._lock:
+            self._db.execute("DELETE FROM memories WHERE memory_id = ?", (memory_id,))
+            self._db.execute(
+                "INSERT INTO memories (memory_id, document, metadata) VALUES (?, ?, ?)",
+                (memory_id, document, json.dumps(metadata or {}))
+            )
+            self._db.commit()
+
+    def delete(self, ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM memories WHERE memory_id = ?", [(memory_id,) for memory_id in ids])
+            self._db.commit()
+
+    def rebuild(self, ids, documents, metadatas):
+        with self._lock:
+            self._db.execute("DELETE FROM memories")
+            self._db.commit()
+        self.add(ids, documents, metadatas)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def search(self, query, limit=10, where=None):
+        """Return [(memory_id, document, metadata)] best-first for any of the query's terms."""
+        terms = _TOKEN_PATTERN.findall(query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        # Over-fetch when filtering, since where is applied after ranking.
+        fetch = limit * 5 if where else limit
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT memory_id, document, metadata FROM memories WHERE memories MATCH ? ORDER BY bm25(memories) LIMIT ?",
+                (match, fetch)
+            ).fetchall()
+        hits = []
+        for memory_id, document, metadata in rows:
+            metadata = json.loads(metadata)
+            if where and not matches_where(metadata, where):
+                continue
+            hits.append((memory_id, document, metadata))
+            if len(hits) == limit:
+                break
+        return hits
+
+
+def open_keyword_index(db_path):
+    """Open a KeywordIndex, or return None if this SQLite build lacks FTS5."""
+    try:
+        return KeywordIndex(db_path)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Keyword index disabled, SQLite FTS5 unavailable: {e}")
+        return None
@@ -0,0 +1,130 @@
+import math
+import os
+import time
+
+import numpy as np
+
+# Memories whose embeddings are at least this cosine-similar are merged into one.
+MEMORY_DUPLICATE_SIMILARITY = float(os.environ.get("MEMORY_DUPLICATE_SIMILARITY", 0.92))
+# Nearest neighbours (from the store's index) checked per memory when looking for duplicates.
+MEMORY_DUPLICATE_CANDIDATES = int(os.environ.get("MEMORY_DUPLICATE_CANDIDATES", 10))
+# Evict the least important memories beyond this many entries (0 disables the cap).
+MEMORY_MAX_ENTRIES = int(os.environ.get("MEMORY_MAX_ENTRIES", 5000))
+# Evict memories not created or recalled for this many days (0 disables expiry).
+MEMORY_TTL_DAYS = float(os.environ.get("MEMORY_TTL_DAYS", 0))
+# Recency half-life used when scoring importance.
+MEMORY_IMPORTANCE_HALF_LIFE_DAYS = float(os.environ.get("MEMORY_IMPORTANCE_HALF_LIFE_DAYS", 30))
+
+SECONDS_PER_DAY = 86400
+# Merge groups listed in a compaction report, and characters shown of each text.
+MERGE_REPORT_LIMIT = 10
+MERGE_REPORT_PREVIEW_CHARS = 80
+
+
+def last_active(metadata):
+    """Unix time a memory was last recalled, or created if it never was."""
+    metadata = metadata or {}
+    return metadata.get("last_accessed") or metadata.get("created_at") or 0
+
+
+def importance(metadata, now=None, half_life_days=MEMORY_IMPORTANCE_HALF_LIFE_DAYS):
+    """
+    Score how worth keeping a memory is.
+
+    Frequently recalled memories score higher (logarithmically, so a few hits
+    matter more than the hundredth), and the score halves every
+    half_life_days since the memory was last active.
+    """
+    now = now or time.time()
+    access_count = (metadata or {}).get("access_count", 0)
+    age_days = max(0.0, (now - last_active(metadata)) / SECONDS_PER_DAY)
+    return (1.0 + math.log1p(access_count)) * 0.5 ** (age_days / half_life_days)
+
+
+def cluster_near_duplicates(vectors, order, candidates, threshold=MEMORY_DUPLICATE_SIMILARITY):
+    """
+    Group rows whose cosine similarity to a cluster's representative is >= threshold.
+
+    Rows are visited in the given order (most important first), and each
+    unclaimed row becomes the representative of a new cluster that claims
+    every unclaimed row among its candidates (candidates[row], e.g. its
+    nearest neighbours from the vector store) that is similar to it. Only
+    candidates are compared, so the cost is O(n * k * d) rather than
+    O(n^2 * d). Returns [(representative, [duplicates])] for clusters with
+    at least one duplicate.
+    """
+    if len(vectors) < 2:
+        return []
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    claimed = np.zeros(len(vectors), dtype=bool)
+    clusters = []
+    for row in order:
+        if claimed[row]:
+            continue
+        claimed[row] = True
+        nearby = np.asarray(candidates[row], dtype=np.int64)
+        nearby = nearby[~claimed[nearby]]
+        duplicates = nearby[(vectors[nearby] @ vectors[row]) >= threshold]
+        if len(duplicates):
+            claimed[duplicates] = True
+            clusters.append((row, duplicates.tolist()))
+    return clusters
+
+
+def merge_metadata(representative, duplicates):
+    """Combine the usage history of merged memories into the representative's metadata."""
+    merged = dict(representative or {})
+    group = [representative or {}] + [duplicate or {} for duplicate in duplicates]
+    merged["access_count"] = sum(metadata.get("access_count", 0) for metadata in group)
+    created = [metadata["created_at"] for metadata in group if metadata.get("created_at")]
+    if created:
+        merged["created_at"] = min(created)
+    accessed = [metadata["last_accessed"] for metadata in group if metadata.get("last_accessed")]
+    if accessed:
+        merged["last_accessed"] = max(accessed)
+    merged["merged_count"] = sum(metadata.get("merged_count", 1) for metadata in group)
+    return merged
+
+
+def merge_documents(representative, duplicates):
+    """
+    Combine the texts of merged memories so no fact is lost.
+
+    Near-duplicates can still differ in detail ("favorite color is blue" vs
+    "... red"), so each duplicate whose text is not already contained in
+    the representative's is appended on its own line.
+    """
+    merged = representative or ""
+    seen = " ".join(merged.split()).lower()
+    for duplicate in duplicates:
+        duplicate = (duplicate or "").strip()
+        normalized = " ".join(duplicate.split()).lower()
+        if normalized and normalized not in seen:
+            merged = f"{merged}\n{duplicate}" if merged else duplicate
+            seen = f"{seen}\n{normalized}"
+    return merged
+
+
+def format_compaction_stats(stats):
+    if stats is None:
+        return "Memory compaction has not run yet."
+    lines = [
+        f"Memory compaction ({'dry run' if stats['dry_run'] else 'applied'}) in {stats['seconds']:.2f}s:",
+        f"- Entries: {stats['entries_before']} -> {stats['entries_after']} ({stats['entries_reclaimed']} reclaimed)",
+        f"- Merged near-duplicates: {stats['merged']} into {stats['clusters']} memories",
+        f"- Expired (TTL): {stats['expired']}",
+        f"- Evicted (size cap): {stats['evicted']}",
+        f"- Bytes reclaimed: {stats['bytes_reclaimed']}",
+    ]
+    groups = stats.get("merge_groups") or []
+    if groups:
+        lines.append("Merges (duplicate texts are appended to the kept memory):")
+        for group in groups[:MERGE_REPORT_LIMIT]:
+            lines.append(f"- Keep {group['keep']}: {group['text']}")
+            lines.extend(f"  + {memory_id}: {text}" for memory_id, text in group["merged"])
+        if len(groups) > MERGE_REPORT_LIMIT:
+            lines.append(f"- ... and {len(groups) - MERGE_REPORT_LIMIT} more")
+    if stats["dry_run"]:
+        lines.append("Nothing was changed; run compact_memories with dry_run=false to apply.")
+    return "\n".join(lines)
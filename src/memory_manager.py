@@ -1,39 +1,277 @@
+import collections
 import chromadb
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
 import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from src.vector_store import NumpyCollection
+from src.embedding_cache import EmbeddingCache
+from src.embedding_model import create_embedding_function
+from src.keyword_index import open_keyword_index
+from src.memory_compaction import (
+    MEMORY_DUPLICATE_CANDIDATES, MEMORY_DUPLICATE_SIMILARITY, MEMORY_MAX_ENTRIES, MEMORY_TTL_DAYS, MERGE_REPORT_PREVIEW_CHARS, SECONDS_PER_DAY,
+    cluster_near_duplicates, format_compaction_stats, importance, last_active, merge_documents, merge_metadata
+)
+
+logger = logging.getLogger(__name__)
+
+# "chroma" (default) or "numpy" for the local memory-mapped index in src/vector_store.py.
+MEMORY_BACKEND = os.environ.get("MEMORY_BACKEND", "chroma")
+MEMORY_QUANTIZE = os.environ.get("MEMORY_QUANTIZE", "").lower() in ("1", "true", "yes")
+LIST_MEMORIES_MAX_LIMIT = 100
+LIST_MEMORIES_MAX_TOKENS = 2000
+LIST_PREVIEW_CHARS = 80
+# recall_memories fuses this many times k candidates from each retriever.
+HYBRID_CANDIDATE_FACTOR = 3
+RRF_K = 60
+# Recall hits are buffered and written to memory metadata once this many memories are pending.
+ACCESS_FLUSH_THRESHOLD = 50
+# Memories whose neighbours are looked up per query while compacting.
+COMPACTION_QUERY_BLOCK = 256
+# Seconds between background compaction runs. Compaction deletes memories, so it is
+# opt-in: 0 (the default) leaves it to explicit compact_memories calls.
+MEMORY_COMPACTION_INTERVAL = int(os.environ.get("MEMORY_COMPACTION_INTERVAL", 0))
+# Memories are namespaced per tenant (user or session). The default tenant keeps the
+# original collection names, so existing single-user stores are used unchanged.
+DEFAULT_TENANT = "default"
+# MemoryManagers kept open at once; the least recently used tenant's is closed beyond this.
+MEMORY_MAX_OPEN_TENANTS = int(os.environ.get("MEMORY_MAX_OPEN_TENANTS", 64))
+# Maximum memories a tenant may store (0 for no limit).
+MEMORY_TENANT_QUOTA = int(os.environ.get("MEMORY_TENANT_QUOTA", 0))
+# Usage metadata carried over when a memory's text or metadata is replaced.
+USAGE_METADATA_KEYS = ("created_at", "access_count", "last_accessed", "merged_count")
+
+# The tenant whose memories tool calls use; set per Streamlit session with set_current_tenant.
+current_tenant = contextvars.ContextVar("memory_tenant", default=DEFAULT_TENANT)
 
 class MemoryManager:
-    def __init__(self, persist_directory="./chroma_db"):
+    """
+    Memories and user profile of one tenant.
+
+    Tenants other than DEFAULT_TENANT get their own collections and keyword
+    index, so a tenant's queries only scan its own memories. The embedding
+    model, embedding cache and Chroma client are heavy and tenant-neutral;
+    pass them in (see for_tenant) to share them between tenants.
+    """
+
+    def __init__(self, persist_directory="./chroma_db", backend=None, tenant_id=DEFAULT_TENANT,
+                 quota=MEMORY_TENANT_QUOTA, embedding_function=None, embedding_cache=None, client=None):
         self.persist_directory = persist_directory
-        self.client = chromadb.PersistentClient(path=self.persist_directory)
-        self.memories_collection = self.client.get_or_create_collection("memories")
-        self.profile_collection = self.client.get_or_create_collection("user_profile")
+        self.backend = backend or MEMORY_BACKEND
+        self.tenant_id = tenant_id
+        self.quota = quota
+        self.embedding_function = embedding_function or create_embedding_function()
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            self._embedding_model_name(),
+            os.path.join(self.persist_directory, "embedding_cache.sqlite3")
+        )
+        if self.backend == "chroma":
+            self.client = client or chromadb.PersistentClient(path=self.persist_directory)
+        elif self.backend != "numpy":
+            raise ValueError(f"Unknown memory backend: {self.backend}")
+        self.memories_collection = self._get_collection(self._namespaced("memories"))
+        self.profile_collection = self._get_collection(self._namespaced("user_profile"))
+        self.keyword_index = open_keyword_index(
+            os.path.join(self.persist_directory, f"{self._namespaced(f'keyword_index_{self.backend}')}.sqlite3")
+        )
+        self._sync_keyword_index()
+        self._pending_access = {}
+        self._access_lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self.last_compaction_stats = None
+        # Maintained by the module's manager registry: holders, and whether it has been evicted.
+        self._users = 0
+        self._evicted = False
+
+    def for_tenant(self, tenant_id):
+        """Return a MemoryManager for another tenant that shares this one's model, caches and client."""
+        return MemoryManager(
+            self.persist_directory,
+            self.backend,
+            tenant_id=tenant_id,
+            quota=self.quota,
+            embedding_function=self.embedding_function,
+            embedding_cache=self.embedding_cache,
+            client=getattr(self, "client", None)
+        )
+
+    def close(self):
+        """Write pending recall stats and close this tenant's keyword index (shared resources stay open)."""
+        self.flush_access_stats()
+        if self.keyword_index:
+            self.keyword_index.close()
+
+    def _namespaced(self, name):
+        if self.tenant_id == DEFAULT_TENANT:
+            return name
+        return f"{name}__{tenant_key(self.tenant_id)}"
+
+    def _sync_keyword_index(self):
+        # Rebuild once for stores created before the index existed (or edited outside this class).
+        if self.keyword_index is None or self.keyword_index.count() == self.memories_collection.count():
+            return
+        logger.info("Rebuilding memory keyword index")
+        existing = self.memories_collection.get()
+        self.keyword_index.rebuild(existing['ids'], existing['documents'], existing['metadatas'])
+
+    def _get_collection(self, name):
+        if self.backend == "numpy":
+            path = os.path.join(self.persist_directory, "numpy", name)
+            return NumpyCollection(path, embedding_function=self.embedding_function, quantize=MEMORY_QUANTIZE)
+        return self.client.get_or_create_collection(name, embedding_function=self.embedding_function)
+
+    def warm_up(self):
+        """Load the embedding model now (the default one downloads on first use) rather than on the first query."""
+        self.embedding_function(["warm up"])
+
+    def _embedding_model_name(self):
+        if getattr(self.embedding_function, "model_id", None):
+            return self.embedding_function.model_id
+        try:
+            return self.embedding_function.name()
+        except Exception:
+            return type(self.embedding_function).__name__
+
+    def embed(self, texts):
+        """Embed several texts in one forward pass, skipping any already in the embedding cache."""
+        return self.embedding_cache.embed(list(texts), self.embedding_function)
+
+    def get_embedding_cache_stats(self):
+        return self.embedding_cache.stats()
 
     def save_memory(self, text, metadata=None):
-        memory_id = str(uuid.uuid4())
+        return self.save_memories([{"text": text, "metadata": metadata}])[0]
+
+    def save_memories(self, memories):
+        """Save several memories with one embedding batch and one collection write."""
+        if self.quota and self.memories_collection.count() + len(memories) > self.quota:
+            raise ValueError(
+                f"Memory quota of {self.quota} memories reached. Delete or update existing memories, "
+                "or run compact_memories, before saving new ones."
+            )
+        memory_ids = [str(uuid.uuid4()) for _ in memories]
+        created_at = int(time.time())
+        texts = [memory["text"] for memory in memories]
+        metadatas = [
+            {**(memory.get("metadata") or {"source": "user_interaction"}), "created_at": created_at}
+            for memory in memories
+        ]
         self.memories_collection.add(
-            documents=[text],
-            metadatas=[metadata or {"source": "user_interaction"}],
-            ids=[memory_id]
+            documents=texts,
+            embeddings=self.embed(texts),
+            metadatas=metadatas,
+            ids=memory_ids
         )
-        return f"Memory saved with ID: {memory_id}"
+        if self.keyword_index:
+            self.keyword_index.add(memory_ids, texts, metadatas)
+        return [f"Memory saved with ID: {memory_id}" for memory_id in memory_ids]
+
+    def recall_memories(self, query, k=3, where=None, compact=False):
+        return self.recall_memories_batch([query], k, where, compact)[0]
 
-    def recall_memories(self, query, k=3):
+    def recall_memories_batch(self, queries, k=3, where=None, compact=False):
+        """
+        Run several recall queries with one embedding batch and one collection query.
+
+        Semantic candidates are fused with keyword-index hits (reciprocal rank
+        fusion), so exact terms like URLs, tickers and names are found in the
+        same call. An optional metadata where filter applies to both; compact
+        returns one line per memory.
+        """
+        where = self._build_where(where)
+        candidates = k * HYBRID_CANDIDATE_FACTOR if self.keyword_index else k
         results = self.memories_collection.query(
-            query_texts=[query],
-            n_results=k
+            query_embeddings=self.embed(queries),
+            n_results=candidates,
+            where=where
         )
-        if results['documents'][0]:
+        recalled = []
+        for i, query in enumerate(queries):
+            keyword_hits = self.keyword_index.search(query, candidates, where) if self.keyword_index else []
+            fused = self._fuse_results(results, i, keyword_hits, k)
+            self._record_access([memory["id"] for memory in fused])
+            recalled.append(self._format_recall_results(fused, compact))
+        return recalled
+
+    def _record_access(self, memory_ids):
+        with self._access_lock:
+            now = int(time.time())
+            for memory_id in memory_ids:
+                count, _ = self._pending_access.get(memory_id, (0, now))
+                self._pending_access[memory_id] = (count + 1, now)
+            should_flush = len(self._pending_access) >= ACCESS_FLUSH_THRESHOLD
+        if should_flush:
+            self.flush_access_stats()
+
+    def flush_access_stats(self):
+        """Write buffered recall counts and times into the recalled memories' metadata."""
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if not pending:
+            return
+        current = self.memories_collection.get(ids=list(pending))
+        if not current['ids']:
+            return
+        metadatas = []
+        for memory_id, metadata in zip(current['ids'], current['metadatas']):
+            count, accessed_at = pending[memory_id]
+            metadata = dict(metadata or {})
+            metadata["access_count"] = metadata.get("access_count", 0) + count
+            metadata["last_accessed"] = max(metadata.get("last_accessed", 0), accessed_at)
+            metadatas.append(metadata)
+        self.memories_collection.update(ids=current['ids'], metadatas=metadatas)
+        if self.keyword_index:
+            for memory_id, document, metadata in zip(current['ids'], current['documents'], metadatas):
+                self.keyword_index.update(memory_id, document, metadata)
+
+    @staticmethod
+    def _fuse_results(results, query_index, keyword_hits, k):
+        memories = {}
+        for rank, memory_id in enumerate(results['ids'][query_index]):
+            memories[memory_id] = {
+                "id": memory_id,
+                "document": results['documents'][query_index][rank],
+                "metadata": results['metadatas'][query_index][rank],
+                "distance": results['distances'][query_index][rank],
+                "matched_by": ["semantic"],
+                "score": 1.0 / (RRF_K + rank + 1)
+            }
+        for rank, (memory_id, document, metadata) in enumerate(keyword_hits):
+            memory = memories.setdefault(memory_id, {
+                "id": memory_id,
+                "document": document,
+                "metadata": metadata,
+                "distance": None,
+                "matched_by": [],
+                "score": 0.0
+            })
+            memory["matched_by"].append("keyword")
+            memory["score"] += 1.0 / (RRF_K + rank + 1)
+        return sorted(memories.values(), key=lambda memory: memory["score"], reverse=True)[:k]
+
+    def _format_recall_results(self, recalled, compact=False):
+        if recalled and compact:
+            return "\n".join(f"- [{memory['id']}] {memory['document']}" for memory in recalled)
+        if recalled:
             memories = []
-            for i, (doc, metadata, distance) in enumerate(zip(results['documents'][0], results['metadatas'][0], results['distances'][0])):
+            for i, memory in enumerate(recalled):
                 memory_info = f"Memory {i+1}:\n"
-                memory_info += f"ID: {results['ids'][0][i]}\n"
-                memory_info += f"Content: {doc}\n"
-                memory_info += f"Metadata: {metadata}\n"
-                memory_info += f"Semantic Distance: {distance}\n"
+                memory_info += f"ID: {memory['id']}\n"
+                memory_info += f"Content: {memory['document']}\n"
+                memory_info += f"Metadata: {memory['metadata']}\n"
+                if memory['distance'] is not None:
+                    memory_info += f"Semantic Distance: {memory['distance']}\n"
+                memory_info += f"Matched By: {', '.join(memory['matched_by'])}\n"
                 memories.append(memory_info)
             return "\n\n".join(memories)
         else:
-            return "No relevant memories found based on the semantic search."
+            return "No relevant memories found."
 
     def update_memory(self, memory_id, new_text, new_metadata=None):
         try:
@@ -41,11 +279,19 @@ class MemoryManager:
             if not current_memory['documents']:
                 return f"Memory with ID {memory_id} not found."
             
+            metadata = dict(new_metadata or {"source": "user_interaction", "updated": True})
+            current_metadata = current_memory['metadatas'][0] or {}
+            for key in USAGE_METADATA_KEYS:
+                if current_metadata.get(key) is not None:
+                    metadata.setdefault(key, current_metadata[key])
             self.memories_collection.update(
                 ids=[memory_id],
                 documents=[new_text],
-                metadatas=[new_metadata or {"source": "user_interaction", "updated": True}]
+                embeddings=self.embed([new_text]),
+                metadatas=[metadata]
             )
+            if self.keyword_index:
+                self.keyword_index.update(memory_id, new_text, metadata)
             return f"Memory with ID {memory_id} updated successfully."
         except Exception as e:
             return f"Error updating memory: {str(e)}"
@@ -53,10 +299,137 @@ class MemoryManager:
     def delete_memory(self, memory_id):
         try:
             self.memories_collection.delete(ids=[memory_id])
+            if self.keyword_index:
+                self.keyword_index.delete([memory_id])
             return f"Memory with ID {memory_id} deleted successfully."
         except Exception as e:
             return f"Error deleting memory: {str(e)}"
 
+    def compact_memories(self, dry_run=True, similarity_threshold=MEMORY_DUPLICATE_SIMILARITY,
+                         max_entries=MEMORY_MAX_ENTRIES, ttl_days=MEMORY_TTL_DAYS):
+        """
+        Merge near-duplicate memories and evict stale or unimportant ones.
+
+        Memories not created or recalled within ttl_days are expired first.
+        The rest are clustered by embedding similarity, and each cluster is
+        merged into its most important member (see memory_compaction.importance),
+        which inherits the cluster's access counts and has the other members'
+        texts appended, so differing details survive. If more than max_entries
+        remain, the least important are evicted. Returns a report listing the
+        merges; by default this is a dry run and nothing is changed.
+        """
+        with self._compaction_lock:
+            started = time.time()
+            self.flush_access_stats()
+            existing = self.memories_collection.get()
+            ids = existing['ids']
+            documents = [document or "" for document in existing['documents']]
+            metadatas = [dict(metadata or {}) for metadata in existing['metadatas']]
+            vectors = self.embed(documents) if ids else []
+            dim = len(vectors[0]) if ids else 0
+            scores = [importance(metadata, started) for metadata in metadatas]
+            removed = {}
+
+            if ttl_days:
+                cutoff = started - ttl_days * SECONDS_PER_DAY
+                for i, metadata in enumerate(metadatas):
+                    # Memories saved before created_at was recorded have no age and never expire.
+                    if 0 < last_active(metadata) < cutoff:
+                        removed[ids[i]] = "expired"
+
+            survivors = [i for i in range(len(ids)) if ids[i] not in removed]
+            order = sorted(range(len(survivors)), key=lambda j: (scores[survivors[j]], len(documents[survivors[j]])), reverse=True)
+            merged_metadatas = {}
+            merge_groups = []
+            candidates = self._duplicate_candidates(ids, vectors, survivors)
+            clusters = cluster_near_duplicates([vectors[i] for i in survivors], order, candidates, similarity_threshold)
+            for representative, duplicates in clusters:
+                representative = survivors[representative]
+                duplicates = [survivors[j] for j in duplicates]
+                for i in duplicates:
+                    removed[ids[i]] = "merged"
+                merge_groups.append({
+                    "keep": ids[representative],
+                    "text": documents[representative][:MERGE_REPORT_PREVIEW_CHARS],
+                    "merged": [(ids[i], documents[i][:MERGE_REPORT_PREVIEW_CHARS]) for i in duplicates]
+                })
+                documents[representative] = merge_documents(documents[representative], [documents[i] for i in duplicates])
+                metadatas[representative] = merge_metadata(metadatas[representative], [metadatas[i] for i in duplicates])
+                scores[representative] = importance(metadatas[representative], started)
+                merged_metadatas[ids[representative]] = (documents[representative], metadatas[representative])
+
+            remaining = [i for i in range(len(ids)) if ids[i] not in removed]
+            if max_entries and len(remaining) > max_entries:
+                remaining.sort(key=lambda i: scores[i])
+                for i in remaining[:len(remaining) - max_entries]:
+                    removed[ids[i]] = "evicted"
+                    merged_metadatas.pop(ids[i], None)
+            merge_groups = [group for group in merge_groups if group["keep"] in merged_metadatas]
+
+            # Chroma does not report its on-disk size, so estimate from what was removed.
+            index = {memory_id: i for i, memory_id in enumerate(ids)}
+            bytes_reclaimed = sum(
+                len(documents[index[memory_id]].encode("utf-8")) + len(str(metadatas[index[memory_id]])) + dim * 4
+                for memory_id in removed
+            )
+            if not dry_run:
+                if merged_metadatas:
+                    merged_documents = [document for document, _ in merged_metadatas.values()]
+                    self.memories_collection.update(
+                        ids=list(merged_metadatas),
+                        documents=merged_documents,
+                        embeddings=self.embed(merged_documents),
+                        metadatas=[metadata for _, metadata in merged_metadatas.values()]
+                    )
+                if removed:
+                    self.memories_collection.delete(ids=list(removed))
+                if self.keyword_index:
+                    for memory_id, (document, metadata) in merged_metadatas.items():
+                        self.keyword_index.update(memory_id, document, metadata)
+                    self.keyword_index.delete(list(removed))
+                if hasattr(self.memories_collection, "vacuum"):
+                    bytes_reclaimed = self.memories_collection.vacuum()
+
+            reasons = list(removed.values())
+            stats = {
+                "dry_run": dry_run,
+                "entries_before": len(ids),
+                "entries_after": len(ids) - len(removed),
+                "entries_reclaimed": len(removed),
+                "merged": reasons.count("merged"),
+                "clusters": len(clusters),
+                "expired": reasons.count("expired"),
+                "evicted": reasons.count("evicted"),
+                "bytes_reclaimed": bytes_reclaimed,
+                "merge_groups": merge_groups,
+                "seconds": time.time() - started,
+                "finished_at": int(time.time())
+            }
+            if not dry_run:
+                self.last_compaction_stats = stats
+            logger.info(f"Memory compaction: {stats}")
+            return format_compaction_stats(stats)
+
+    def _duplicate_candidates(self, ids, vectors, survivors, k=MEMORY_DUPLICATE_CANDIDATES):
+        """
+        Nearest neighbours of each surviving memory, as indexes into survivors.
+
+        Found with the store's own query (an ANN index for Chroma), a block
+        of memories per call, instead of comparing every pair.
+        """
+        position = {ids[i]: j for j, i in enumerate(survivors)}
+        candidates = []
+        for start in range(0, len(survivors), COMPACTION_QUERY_BLOCK):
+            block = survivors[start:start + COMPACTION_QUERY_BLOCK]
+            neighbours = self.memories_collection.query(
+                query_embeddings=[vectors[i] for i in block],
+                n_results=min(k + 1, len(ids)),
+                include=[]
+            )
+            candidates.extend([position[memory_id] for memory_id in hit_ids if memory_id in position]
+                              for hit_ids in neighbours['ids'])
+        return candidates
+
     def update_user_profile(self, profile_data):
         try:
             existing_profile = self.profile_collection.get(ids=["user_profile"])
@@ -83,10 +456,167 @@ class MemoryManager:
         else:
             return "No user profile found."
 
-    def list_all_memories(self):
-        results = self.memories_collection.get()
-        if results['documents']:
-            memories = [f"Memory ID: {id}, Content: {doc}" for id, doc in zip(results['ids'], results['documents'])]
-            return "\n\n".join(memories)
-        else:
-            return "No memories found."
\ No newline at end of file
+    def list_all_memories(self, limit=20, cursor=None, offset=0, where=None, created_after=None,
+                          created_before=None, compact=True, max_tokens=LIST_MEMORIES_MAX_TOKENS):
+        """
+        List stored memories one page at a time.
+
+        Pages are fetched with limit/offset (cursor is the opaque offset
+        returned by the previous page) and can be narrowed with a metadata
+        where filter and ISO created_after/created_before dates. Compact mode
+        shows the ID and a short preview. The page also stops early once
+        max_tokens worth of text has been collected.
+        """
+        start = int(cursor) if cursor else int(offset)
+        limit = max(1, min(int(limit), LIST_MEMORIES_MAX_LIMIT))
+        results = self.memories_collection.get(
+            where=self._build_where(where, created_after, created_before),
+            limit=limit,
+            offset=start
+        )
+        if not results['documents']:
+            return "No memories found." if start == 0 else "No more memories."
+
+        budget = max_tokens * 4
+        lines = []
+        for memory_id, doc, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+            if compact:
+                preview = " ".join(doc.split())
+                if len(preview) > LIST_PREVIEW_CHARS:
+                    preview = preview[:LIST_PREVIEW_CHARS] + "..."
+                line = f"{memory_id}: {preview}"
+            else:
+                line = f"Memory ID: {memory_id}, Content: {doc}, Metadata: {metadata}"
+            if lines and budget - len(line) < 0:
+                break
+            budget -= len(line)
+            lines.append(line)
+
+        next_offset = start + len(lines)
+        header = f"Memories {start + 1}-{next_offset} (of {self.memories_collection.count()} stored):"
+        output = header + "\n" + ("\n" if compact else "\n\n").join(lines)
+        if len(lines) < len(results['ids']) or len(results['ids']) == limit:
+            output += f"\n\nMore memories may be available: call again with cursor=\"{next_offset}\"."
+        return output
+
+    @staticmethod
+    def _build_where(where=None, created_after=None, created_before=None):
+        clauses = [{key: value} for key, value in (where or {}).items()]
+        if created_after:
+            clauses.append({"created_at": {"$gte": _to_timestamp(created_after)}})
+        if created_before:
+            clauses.append({"created_at": {"$lt": _to_timestamp(created_before)}})
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+def tenant_key(tenant_id):
+    """Turn a tenant id (e.g. an email address) into a string safe for collection and file names."""
+    readable = re.sub(r"[^A-Za-z0-9_-]+", "-", tenant_id).strip("-_")[:32]
+    digest = hashlib.sha256(tenant_id.encode("utf-8")).hexdigest()[:10]
+    return f"{readable}-{digest}" if readable else digest
+
+def _to_timestamp(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+_memory_managers = collections.OrderedDict()
+_memory_manager_lock = threading.Lock()
+_memory_status = "not started"
+
+def set_current_tenant(tenant_id):
+    """Make tenant_id the memory tenant for this thread and for tool calls it submits."""
+    current_tenant.set(tenant_id or DEFAULT_TENANT)
+
+def get_memory_manager(tenant_id=None):
+    """
+    Return the MemoryManager of tenant_id (default: the current tenant), creating it on first use.
+
+    Managers share the default tenant's embedding model and caches. Up to
+    MEMORY_MAX_OPEN_TENANTS are kept open; beyond that the least recently
+    used tenant's manager is evicted, closed once no using_memory_manager
+    block holds it, and reopened on its next use. Use that context manager
+    rather than this function to run memory operations.
+    """
+    return _open_memory_manager(tenant_id, 0)
+
+@contextmanager
+def using_memory_manager(tenant_id=None):
+    """Yield tenant_id's MemoryManager, keeping it open until the block exits even if it is evicted meanwhile."""
+    manager = _open_memory_manager(tenant_id, 1)
+    try:
+        yield manager
+    finally:
+        _release_memory_manager(manager)
+
+def _open_memory_manager(tenant_id, users):
+    tenant_id = tenant_id or current_tenant.get()
+    closable = []
+    with _memory_manager_lock:
+        if DEFAULT_TENANT not in _memory_managers:
+            _memory_managers[DEFAULT_TENANT] = MemoryManager()
+        manager = _memory_managers.get(tenant_id)
+        if manager is None:
+            manager = _memory_managers[tenant_id] = _memory_managers[DEFAULT_TENANT].for_tenant(tenant_id)
+            evicted = [tenant for tenant in _memory_managers if tenant not in (DEFAULT_TENANT, tenant_id)]
+            evicted = evicted[:max(0, len(_memory_managers) - max(MEMORY_MAX_OPEN_TENANTS, 2))]
+            for tenant in evicted:
+                evicted_manager = _memory_managers.pop(tenant)
+                evicted_manager._evicted = True
+                if not evicted_manager._users:
+                    closable.append(evicted_manager)
+        _memory_managers.move_to_end(tenant_id)
+        manager._users += users
+    for evicted_manager in closable:
+        evicted_manager.close()
+    return manager
+
+def _release_memory_manager(manager):
+    with _memory_manager_lock:
+        manager._users -= 1
+        closable = manager._evicted and not manager._users
+    if closable:
+        manager.close()
+
+def warm_up_memory_manager():
+    """Start creating the shared MemoryManager and loading its model in a background thread."""
+    global _memory_status
+    with _memory_manager_lock:
+        if _memory_status != "not started":
+            return
+        _memory_status = "warming up"
+    threading.Thread(target=_warm_up, name="memory-warm-up", daemon=True).start()
+
+def _warm_up():
+    global _memory_status
+    try:
+        get_memory_manager(DEFAULT_TENANT).warm_up()
+        _memory_status = "ready"
+    except Exception as e:
+        logger.error(f"Memory warm-up failed: {e}", exc_info=True)
+        _memory_status = "failed"
+        return
+    if MEMORY_COMPACTION_INTERVAL > 0:
+        threading.Thread(target=_compaction_loop, name="memory-compaction", daemon=True).start()
+
+def _compaction_loop():
+    while True:
+        time.sleep(MEMORY_COMPACTION_INTERVAL)
+        with _memory_manager_lock:
+            managers = list(_memory_managers.items())
+            for _, manager in managers:
+                manager._users += 1
+        for tenant_id, manager in managers:
+            try:
+                manager.compact_memories(dry_run=False)
+            except Exception as e:
+                logger.error(f"Memory compaction failed for tenant {tenant_id}: {e}", exc_info=True)
+            finally:
+                _release_memory_manager(manager)
+
+def get_memory_status():
+    """One of "not started", "warming up", "ready" or "failed"."""
+    return _memory_status
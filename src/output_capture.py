@@ -0,0 +1,216 @@
+import collections
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+# Tokens of each output stream (stdout, stderr) returned to the model; the rest is spilled to an artifact.
+TOOL_OUTPUT_TOKEN_BUDGET = int(os.environ.get("TOOL_OUTPUT_TOKEN_BUDGET", 2000))
+TOOL_OUTPUT_DIR = os.environ.get("TOOL_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "toolboxai_outputs"))
+# Spilled output beyond this many bytes is dropped (the byte count still reports it).
+TOOL_OUTPUT_MAX_ARTIFACT_BYTES = int(os.environ.get("TOOL_OUTPUT_MAX_ARTIFACT_BYTES", 50 * 1024 * 1024))
+# Artifacts are deleted after this many hours, and oldest first beyond this total size.
+TOOL_OUTPUT_MAX_AGE_HOURS = float(os.environ.get("TOOL_OUTPUT_MAX_AGE_HOURS", 24))
+TOOL_OUTPUT_MAX_TOTAL_BYTES = int(os.environ.get("TOOL_OUTPUT_MAX_TOTAL_BYTES", 500 * 1024 * 1024))
+# Characters of a running tool's output shown live in the chat.
+TOOL_PROGRESS_CHARS = int(os.environ.get("TOOL_PROGRESS_CHARS", 4000))
+
+CHARS_PER_TOKEN = 4
+PRUNE_INTERVAL = 60  # seconds between artifact clean-ups
+_ARTIFACT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class BoundedOutput(io.TextIOBase):
+    """
+    Text stream that keeps only the head and tail of what is written to it.
+
+    Memory stays bounded however much a tool prints: the first and last
+    budget/2 tokens' worth of characters are kept, everything is counted,
+    and once the tail starts dropping text the complete output is also
+    written to an artifact file that read_tool_output can page through
+    (output that fits the budget never touches the disk). getvalue()
+    returns the head and tail with a marker saying how much was omitted.
+    """
+
+    def __init__(self, token_budget=TOOL_OUTPUT_TOKEN_BUDGET, spill_dir=TOOL_OUTPUT_DIR):
+        self.head_chars = token_budget * CHARS_PER_TOKEN // 2
+        self.tail_chars = token_budget * CHARS_PER_TOKEN - self.head_chars
+        self.spill_dir = spill_dir
+        self.total_chars = 0
+        self.total_bytes = 0
+        self.artifact_id = None
+        self._head = []
+        self._head_len = 0
+        self._tail = collections.deque()
+        self._tail_len = 0
+        self._spill = None
+        self._spilled_bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        written = len(text)
+        size = len(text.encode("utf-8", "replace"))
+        self.total_chars += written
+        self.total_bytes += size
+        if self._spill is not None:
+            self._write_spill(text, size)
+        room = self.head_chars - self._head_len
+        if room > 0:
+            self._head.append(text[:room])
+            self._head_len += min(room, written)
+            text = text[room:]
+        if not text:
+            return written
+        self._tail.append(text)
+        self._tail_len += len(text)
+        if self._tail_len <= self.tail_chars:
+            return written
+        if self._spill is None and self.spill_dir:
+            # Text is about to be dropped: save everything so far, which is still all in memory.
+            self._open_spill()
+        while self._tail_len - len(self._tail[0]) >= self.tail_chars:
+            self._tail_len -= len(self._tail.popleft())
+        if self._tail_len > self.tail_chars:
+            excess = self._tail_len - self.tail_chars
+            self._tail[0] = self._tail[0][excess:]
+            self._tail_len -= excess
+        return written
+
+    @property
+    def truncated(self):
+        return self.total_chars > self._head_len + self._tail_len
+
+    def getvalue(self):
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if not self.truncated:
+            return head + tail
+        omitted = self.total_chars - self._head_len - self._tail_len
+        where = f"full output saved as artifact {self.artifact_id}, page through it with read_tool_output" \
+            if self.artifact_id else "full output was not saved"
+        return f"{head}\n\n[... {omitted} characters omitted ({self.total_bytes} bytes in total); {where} ...]\n\n{tail}"
+
+    def info(self):
+        """Byte count and artifact id, for tool results whose output was truncated."""
+        return {"bytes": self.total_bytes, "artifact": self.artifact_id}
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+        super().close()
+
+    def _open_spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        prune_artifacts(self.spill_dir)
+        self.artifact_id = uuid.uuid4().hex
+        self._spill = open(os.path.join(self.spill_dir, f"{self.artifact_id}.txt"), "w", encoding="utf-8", errors="replace")
+        text = "".join(self._head) + "".join(self._tail)
+        self._write_spill(text, len(text.encode("utf-8", "replace")))
+
+    def _write_spill(self, text, size):
+        if self._spilled_bytes < TOOL_OUTPUT_MAX_ARTIFACT_BYTES:
+            self._spill.write(text)
+            self._spilled_bytes += size
+
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def prune_artifacts(spill_dir=TOOL_OUTPUT_DIR, max_age_hours=TOOL_OUTPUT_MAX_AGE_HOURS,
+                    max_total_bytes=TOOL_OUTPUT_MAX_TOTAL_BYTES, force=False):
+    """Delete artifacts older than max_age_hours, then the oldest until the rest fit max_total_bytes."""
+    global _last_prune
+    with _prune_lock:
+        now = time.time()
+        if not force and now - _last_prune < PRUNE_INTERVAL:
+            return
+        _last_prune = now
+        artifacts = []
+        for entry in os.scandir(spill_dir):
+            if entry.name.endswith(".txt") and _ARTIFACT_ID.match(entry.name[:-4]) and entry.is_file():
+                stat = entry.stat()
+                artifacts.append((stat.st_mtime, stat.st_size, entry.path))
+        prune_files(artifacts, max_age_hours, max_total_bytes, now)
+
+
+def prune_files(files, max_age_hours, max_total_bytes, now=None):
+    """Delete files (given as (mtime, size, path)) older than max_age_hours, then the oldest until the rest fit max_total_bytes."""
+    now = now or time.time()
+    files = sorted(files)
+    total = sum(size for _, size, _ in files)
+    for mtime, size, path in files:
+        if (max_age_hours and now - mtime > max_age_hours * 3600) or (max_total_bytes and total > max_total_bytes):
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class ToolProgress:
+    """
+    Live output of a running tool call, written by the tool thread and read by the UI.
+
+    Only the last max_chars characters are kept; the tool's result still
+    carries its full (bounded) output.
+    """
+
+    def __init__(self, max_chars=TOOL_PROGRESS_CHARS):
+        self.max_chars = max_chars
+        self._text = ""
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self._text = (self._text + text)[-self.max_chars:]
+
+    def getvalue(self):
+        with self._lock:
+            return self._text
+
+
+def copy_stream(stream, sink, chunk_size=65536):
+    """Copy a text stream (e.g. a subprocess pipe) into sink until EOF, chunk by chunk."""
+    for chunk in iter(lambda: stream.read(chunk_size), ""):
+        sink.write(chunk)
+
+
+def bound_result(result, token_budget=TOOL_OUTPUT_TOKEN_BUDGET):
+    """Replace a JSON-serializable result bigger than the budget with a truncated preview string."""
+    try:
+        encoded = json.dumps(result)
+    except (TypeError, ValueError):
+        return result
+    limit = token_budget * CHARS_PER_TOKEN
+    if len(encoded) <= limit:
+        return result
+    return f"{encoded[:limit]}... [result truncated, {len(encoded)} characters in total]"
+
+
+def read_tool_output(artifact_id, offset=0, max_tokens=TOOL_OUTPUT_TOKEN_BUDGET):
+    """Return a page of a spilled tool output, starting at byte offset."""
+    if not _ARTIFACT_ID.match(artifact_id or ""):
+        raise ValueError(f"Invalid artifact id: {artifact_id}")
+    path = os.path.join(TOOL_OUTPUT_DIR, f"{artifact_id}.txt")
+    if not os.path.exists(path):
+        raise ValueError(f"Tool output artifact {artifact_id} not found (it may have been cleaned up)")
+    offset = max(0, int(offset))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_tokens * CHARS_PER_TOKEN)
+    total_bytes = os.path.getsize(path)
+    next_offset = offset + len(data)
+    return {
+        "artifact": artifact_id,
+        "offset": offset,
+        "next_offset": next_offset if next_offset < total_bytes else None,
+        "total_bytes": total_bytes,
+        "text": data.decode("utf-8", errors="replace")
+    }
@@ -2,11 +2,14 @@ from typing import List
 from datetime import datetime
 
 class Persona:
-    def __init__(self, name: str, description: str, system_prompt: str, tools: List[str]):
+    def __init__(self, name: str, description: str, system_prompt: str, tools: List[str], prefetch_memory: bool = False):
         self.name = name
         self.description = description
         self.system_prompt = system_prompt
         self.tools = tools
+        # Fetch the user profile and relevant memories alongside each prompt
+        # instead of waiting for the model to ask for them.
+        self.prefetch_memory = prefetch_memory
 
 def get_current_datetime() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -29,7 +32,8 @@ PERSONAS = {
         6. Provide your final response within <answer></answer> tags.
 
         """,
-        tools=["get_user_profile", "update_user_profile", "save_memory", "recall_memories", "search", "webscrape", "rss_feed"]
+        tools=["get_user_profile", "update_user_profile", "save_memory", "recall_memories", "search", "webscrape", "rss_feed"],
+        prefetch_memory=True
     ),
     "Crypto Investor": Persona(
         name="Crypto Investor",
@@ -92,7 +96,8 @@ PERSONAS = {
         After recalling or creating instructions, engage with the user.
         Current date/time: {get_current_datetime()}
         """,
-        tools=["execute_python_code", "search", "webscrape", "save_memory", "recall_memories", "update_memory"]
+        tools=["execute_python_code", "inspect_python_session", "reset_python_session", "read_tool_output", "search", "webscrape", "save_memory", "save_memories", "recall_memories", "recall_memories_batch", "update_memory"],
+        prefetch_memory=True
     )
     ,
     "Knowledge Curator": Persona(
@@ -114,7 +119,8 @@ PERSONAS = {
 
         Remember, your goal is to provide accurate, helpful responses while being transparent about your knowledge sources and limitations. If you're unsure about anything, admit uncertainty rather than providing potentially incorrect information.
         """,
-        tools=["recall_memories", "save_memory", "search", "execute_python_code"]
+        tools=["recall_memories", "recall_memories_batch", "save_memory", "save_memories", "list_all_memories", "compact_memories", "search", "execute_python_code", "inspect_python_session", "reset_python_session", "read_tool_output"],
+        prefetch_memory=True
     ),
     "CogniscentAI": Persona(
         name="CogniscentAI",
@@ -179,8 +185,8 @@ PERSONAS = {
         Always think through your actions before executing them, considering both operational and financial implications. Use <thinking></thinking> tags to show your reasoning process about which tool to use. For example:
         <thinking>
         Consider which tool would be most appropriate for the current task:
-        - execute_shell_command: for running Linux commands
-        - execute_python_code: for running Python scripts
+        - execute_shell_command: for running Linux commands (the shell persists for this chat, so cd and export carry over; pass a timeout for long builds)
+        - execute_python_code: for running Python scripts (set persistent=true to keep variables between steps of a multi-step task)
         - search: for finding information online
         Evaluate the pros and cons of each tool for this specific situation.
         </thinking>
@@ -194,6 +200,9 @@ PERSONAS = {
             "save_memory",
             "execute_shell_command",
             "execute_python_code",
+            "inspect_python_session",
+            "reset_python_session",
+            "read_tool_output",
             "search",
             "consult_agent"
         ]
@@ -226,6 +235,10 @@ def get_tools_for_persona(name: str) -> List[str]:
     persona = get_persona(name)
     return persona.tools if persona else []
 
+def should_prefetch_memory(name: str) -> bool:
+    persona = get_persona(name)
+    return bool(persona and persona.prefetch_memory)
+
 def get_system_prompt_for_persona(name: str) -> str:
     persona = get_persona(name)
     if persona:
@@ -0,0 +1,66 @@
+import logging
+from concurrent.futures import TimeoutError
+
+from src.memory_manager import current_tenant, get_memory_status, using_memory_manager
+from src.tools import tool_executor
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_MEMORY_COUNT = 3
+PREFETCH_TIMEOUT = 3.0  # seconds to wait for prefetch before sending the request without it
+
+
+def start_prefetch(query, cached_profile=None):
+    """
+    Start fetching the user profile (unless cached) and memories relevant to query.
+
+    Both lookups run concurrently on the shared tool executor while the
+    request is being built; collect them with collect_prefetch. Returns
+    None while the memory store is still warming up.
+    """
+    if get_memory_status() != "ready":
+        return None
+    tenant_id = current_tenant.get()
+    futures = {"memories": tool_executor.submit(_call_memory_manager, tenant_id, "recall_memories", query, PREFETCH_MEMORY_COUNT, None, True)}
+    if cached_profile is None:
+        futures["profile"] = tool_executor.submit(_call_memory_manager, tenant_id, "get_user_profile")
+    return {"futures": futures, "profile": cached_profile}
+
+
+def _call_memory_manager(tenant_id, method, *args):
+    with using_memory_manager(tenant_id) as manager:
+        return getattr(manager, method)(*args)
+
+
+def collect_prefetch(prefetch, timeout=PREFETCH_TIMEOUT):
+    """Return (profile, context_text) from a started prefetch; missing parts are skipped."""
+    profile = prefetch["profile"]
+    memories = None
+    for name, future in prefetch["futures"].items():
+        try:
+            value = future.result(timeout=timeout)
+        except TimeoutError:
+            logger.warning(f"Prefetch of {name} timed out")
+            continue
+        except Exception as e:
+            logger.error(f"Prefetch of {name} failed: {e}")
+            continue
+        if name == "profile":
+            profile = value
+        else:
+            memories = value
+    return profile, format_prefetched_context(profile, memories)
+
+
+def format_prefetched_context(profile, memories):
+    sections = []
+    if profile:
+        sections.append(f"User profile: {profile}")
+    if memories:
+        sections.append(f"Memories relevant to the latest message:\n{memories}")
+    if not sections:
+        return None
+    return (
+        "Context retrieved automatically for this turn (no need to call get_user_profile "
+        "or recall_memories just to get it):\n" + "\n\n".join(sections)
+    )
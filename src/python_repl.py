@@ -1,40 +1,104 @@
-import io
 import sys
 import traceback
+import types
 from contextlib import redirect_stdout, redirect_stderr
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-def execute_python_code(code: str) -> Dict[str, Any]:
+from src.kernel_pool import PYTHON_KERNEL_POOL_SIZE, get_kernel_pool
+from src.output_capture import BoundedOutput, bound_result
+
+PREVIEW_CHARS = 80
+
+def execute_python_code(code: str, timeout: Optional[float] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Execute Python code and return the result, output, and any errors.
 
-    This function creates a sandboxed environment to run Python code,
-    capturing the output, errors, and an optional result value.
+    The code runs in a warm worker process from the kernel pool, with a
+    wall-clock timeout and memory limit (see src/kernel_pool.py), or in
+    this process if PYTHON_KERNEL_POOL_SIZE is 0.
 
     Args:
         code (str): The Python code to execute.
+        timeout (float, optional): Seconds before the run is killed (pool default if omitted).
+        session_id (str, optional): Run in this session's persistent namespace instead of a fresh one.
 
     Returns:
         dict: A dictionary containing the execution result, output, and any errors.
     """
-    output = io.StringIO()
-    error = io.StringIO()
+    if PYTHON_KERNEL_POOL_SIZE > 0:
+        return get_kernel_pool().execute(code, timeout, session_id)
+    if session_id:
+        return {"result": None, "output": "", "error": "Persistent Python sessions need the kernel pool (PYTHON_KERNEL_POOL_SIZE > 0)."}
+    return run_code(code, {})
+
+def inspect_python_session(session_id: Optional[str]) -> Any:
+    """List the variables defined in a chat's persistent Python session."""
+    variables = get_kernel_pool().inspect_session(session_id) if PYTHON_KERNEL_POOL_SIZE > 0 and session_id else None
+    if not variables:
+        return "No variables defined in this chat's Python session."
+    return variables
+
+def reset_python_session(session_id: Optional[str]) -> str:
+    """Discard a chat's persistent Python session and all its variables."""
+    if PYTHON_KERNEL_POOL_SIZE > 0 and session_id and get_kernel_pool().close_session(session_id):
+        return "Python session reset; all variables were discarded."
+    return "This chat has no Python session to reset."
+
+def run_code(code: str, exec_globals: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Execute code in exec_globals, capturing the output, errors, and an optional result value.
+
+    Output and errors are kept within the tool output token budget (head and
+    tail); when either is cut, its byte count and the artifact holding it in
+    full are added as output_info / error_info.
+    """
+    output = BoundedOutput()
+    error = BoundedOutput()
     result = None
 
+    # A result left over from an earlier call in a persistent namespace is not this call's result.
+    exec_globals.pop('result', None)
     try:
         with redirect_stdout(output), redirect_stderr(error):
-            exec_globals = {}
             exec(code, exec_globals)
             if 'result' in exec_globals:
-                result = exec_globals['result']
+                result = bound_result(exec_globals['result'])
     except Exception:
         error.write(traceback.format_exc())
 
-    return {
+    response = {
         "result": result,
         "output": output.getvalue(),
         "error": error.getvalue()
     }
+    for name, stream in (("output", output), ("error", error)):
+        if stream.truncated:
+            response[f"{name}_info"] = stream.info()
+        stream.close()
+    return response
+
+def describe_namespace(namespace: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Summarize the user-defined names in a namespace: name, type and a short preview."""
+    variables = []
+    for name, value in namespace.items():
+        if name.startswith("__"):
+            continue
+        if isinstance(value, types.ModuleType):
+            preview = value.__name__
+        else:
+            try:
+                preview = repr(value)
+            except Exception:
+                preview = "<unrepresentable>"
+        preview = " ".join(preview.split())
+        if len(preview) > PREVIEW_CHARS:
+            preview = preview[:PREVIEW_CHARS] + "..."
+        variable = {"name": name, "type": type(value).__name__, "preview": preview}
+        shape = getattr(value, "shape", None)
+        if isinstance(shape, tuple):
+            variable["shape"] = list(shape)
+        variables.append(variable)
+    return variables
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import src.tools as tools
+
+logger = logging.getLogger(__name__)
+
+# When set, main.py wraps the Bedrock client in a ConversationRecorder that
+# appends every converse_stream call and tool result to this fixture file.
+RECORD_PATH = os.environ.get("CONVERSATION_RECORD_PATH")
+
+
+class ConversationRecorder:
+    """
+    Wrap a bedrock-runtime client and capture converse_stream events to a fixture.
+
+    Fixtures are JSON files of the form
+    {"turns": [{"model_id": ..., "events": [...]}, ...], "tool_calls": [...]}
+    and can be replayed offline with FakeBedrockClient. Recorders writing
+    the same path (one per Streamlit rerun) append to one shared fixture.
+    """
+
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self._lock, self.fixture = _shared_fixture(path)
+
+    def converse_stream(self, **kwargs):
+        response = self._client.converse_stream(**kwargs)
+        turn = {"model_id": kwargs.get("modelId"), "events": []}
+        response["stream"] = self._record(response.get("stream"), turn)
+        return response
+
+    def _record(self, stream, turn):
+        for event in stream or []:
+            turn["events"].append(event)
+            yield event
+        with self._lock:
+            self.fixture["turns"].append(turn)
+            self.save()
+
+    def record_tool_call(self, tool_name, tool_input, result):
+        with self._lock:
+            self.fixture["tool_calls"].append({"name": tool_name, "input": tool_input, "result": result})
+            self.save()
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.fixture, f, indent=1, default=str)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class FakeBedrockClient:
+    """
+    Replay recorded converse_stream turns in order, without any network access.
+
+    tokens_per_second paces text and tool-input deltas like a live model
+    (None replays as fast as possible).
+    """
+
+    def __init__(self, fixture, tokens_per_second=None):
+        self.fixture = load_fixture(fixture) if isinstance(fixture, str) else fixture
+        self.tokens_per_second = tokens_per_second
+        self._next_turn = 0
+        self.calls = []
+
+    def converse_stream(self, **kwargs):
+        turns = self.fixture["turns"]
+        turn = turns[self._next_turn % len(turns)]
+        self._next_turn += 1
+        self.calls.append(kwargs)
+        return {"stream": self._replay(turn["events"])}
+
+    def _replay(self, events):
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0
+        for event in events:
+            if delay and 'contentBlockDelta' in event:
+                time.sleep(delay)
+            yield event
+
+
+class FakeAgentRuntimeClient:
+    """
+    Stand-in for a bedrock-agent-runtime client, for running consult_agent offline.
+
+    invoke_agent answers with the given responses in turn, split into
+    completion chunks of chunk_chars characters (UTF-8 encoded, like the
+    real event stream) and paced at chunks_per_second (None streams as fast
+    as possible). Calls are recorded, and each session's inputs are kept in
+    sessions so tests can check how session ids were scoped.
+    """
+
+    def __init__(self, responses, chunk_chars=16, chunks_per_second=None):
+        self.responses = [responses] if isinstance(responses, str) else list(responses)
+        self.chunk_chars = chunk_chars
+        self.chunks_per_second = chunks_per_second
+        self._next_response = 0
+        self.calls = []
+        self.sessions = {}
+
+    def invoke_agent(self, **kwargs):
+        text = self.responses[self._next_response % len(self.responses)]
+        self._next_response += 1
+        self.calls.append(kwargs)
+        self.sessions.setdefault(kwargs["sessionId"], []).append(kwargs["inputText"])
+        return {"sessionId": kwargs["sessionId"], "contentType": "text/plain", "completion": self._stream(text)}
+
+    def _stream(self, text):
+        delay = 1.0 / self.chunks_per_second if self.chunks_per_second else 0
+        for start in range(0, len(text), self.chunk_chars):
+            if delay:
+                time.sleep(delay)
+            yield {"chunk": {"bytes": text[start:start + self.chunk_chars].encode("utf-8")}}
+
+
+def load_fixture(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+_fixtures = {}
+_fixtures_lock = threading.Lock()
+
+def _shared_fixture(path):
+    # One (lock, fixture) per file, loaded once, so recorders do not overwrite each other's calls.
+    key = os.path.realpath(path)
+    with _fixtures_lock:
+        if key not in _fixtures:
+            fixture = load_fixture(path) if os.path.exists(path) else {"turns": [], "tool_calls": []}
+            _fixtures[key] = (threading.Lock(), fixture)
+        return _fixtures[key]
+
+
+@contextmanager
+def recording_tool_calls(recorder):
+    """Record the results of tool calls submitted from this context (see submit_tool_call) into the recorder's fixture."""
+    token = tools.current_tool_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        tools.current_tool_recorder.reset(token)
+
+
+@contextmanager
+def replaying_tool_calls(fixture, latency=0.0):
+    """Serve process_tool_call from a fixture's recorded results instead of running tools."""
+    recorded = {}
+    for call in fixture.get("tool_calls", []):
+        recorded[(call["name"], json.dumps(call["input"], sort_keys=True))] = call["result"]
+    original = tools.process_tool_call
+
+    def replay(tool_name, tool_input):
+        if latency:
+            time.sleep(latency)
+        result = recorded.get((tool_name, json.dumps(tool_input, sort_keys=True)))
+        if result is None:
+            return json.dumps({"error": f"No recorded result for {tool_name}"})
+        return result
+
+    tools.process_tool_call = replay
+    try:
+        yield
+    finally:
+        tools.process_tool_call = original
+
+
+def synthetic_fixture(answer_tokens=200, tool_rounds=0, tools_per_round=1, tool_result_chars=2000):
+    """
+    Build a fixture shaped like real Claude Converse streams, for benchmarks.
+
+    Each tool round is one assistant message with tools_per_round toolUse
+    blocks; the last turn streams a <thinking>/<answer> reply of roughly
+    answer_tokens text deltas.
+    """
+    turns = []
+    tool_calls = []
+    for round_index in range(tool_rounds):
+        events = [{"messageStart": {"role": "assistant"}}]
+        events += _text_block_events(0, ["<thinking>", "I should ", "use tools", "</thinking>"])
+        for i in range(tools_per_round):
+            index = i + 1
+            tool_input = {"query": f"round {round_index} query {i}"}
+            tool_use_id = f"tooluse_{round_index}_{i}"
+            raw_input = json.dumps(tool_input)
+            events.append({"contentBlockStart": {"start": {"toolUse": {"toolUseId": tool_use_id, "name": "search"}}, "contentBlockIndex": index}})
+            for start in range(0, len(raw_input), 8):
+                events.append({"contentBlockDelta": {"delta": {"toolUse": {"input": raw_input[start:start + 8]}}, "contentBlockIndex": index}})
+            events.append({"contentBlockStop": {"contentBlockIndex": index}})
+            tool_calls.append({
+                "name": "search",
+                "input": tool_input,
+                "result": json.dumps({"result": [{"title": "Result", "href": "https://example.com", "body": "x" * tool_result_chars}]})
+            })
+        events.append({"messageStop": {"stopReason": "tool_use"}})
+        events.append({"metadata": {"usage": {"inputTokens": 1000, "outputTokens": 50, "totalTokens": 1050}}})
+        turns.append({"model_id": "synthetic", "events": events})
+
+    words = [f"word{i} " for i in range(answer_tokens)]
+    events = [{"messageStart": {"role": "assistant"}}]
+    events += _text_block_events(0, ["<thinking>", "Answer", " directly.", "</thi", "nking>\n", "<answer>"] + words + ["</answer>"])
+    events.append({"messageStop": {"stopReason": "end_turn"}})
+    events.append({"metadata": {"usage": {"inputTokens": 1000, "outputTokens": answer_tokens, "totalTokens": 1000 + answer_tokens}}})
+    turns.append({"model_id": "synthetic", "events": events})
+    return {"turns": turns, "tool_calls": tool_calls}
+
+
+def _text_block_events(index, chunks):
+    events = [{"contentBlockDelta": {"delta": {"text": chunk}, "contentBlockIndex": index}} for chunk in chunks]
+    events.append({"contentBlockStop": {"contentBlockIndex": index}})
+    return events
@@ -0,0 +1,129 @@
+import threading
+import time
+
+MIN_TIMEOUT = 1  # seconds; shorter requested timeouts are raised to this
+
+
+def clamp_timeout(timeout, default, maximum):
+    """Keep a timeout requested in tool input within [MIN_TIMEOUT, maximum] (default when unset)."""
+    if not timeout:
+        return default
+    return min(max(float(timeout), MIN_TIMEOUT), max(default, maximum))
+
+
+class SessionRegistry:
+    """
+    Per-chat sessions (shells, Python kernels) kept between tool calls.
+
+    Sessions are made by create() outside the registry lock, since starting
+    one can take seconds, and must have a lock (held while the session is
+    in use) and a last_used time. close(session) is called with the
+    session's lock held when it is removed. At most max_sessions are kept:
+    the least recently used idle one is closed to make room, and get()
+    returns None while all of them are busy. Sessions unused for
+    idle_timeout seconds are closed by a background thread (0 keeps them).
+    """
+
+    def __init__(self, create, close, max_sessions, idle_timeout, name="session", on_evict=None):
+        self.create = create
+        self.close = close
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self.on_evict = on_evict
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._reaper_started = False
+        self._closed = False
+
+    def get(self, key):
+        """Return key's session, creating it if needed, or None if every session is busy."""
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session
+            if len(self._sessions) >= self.max_sessions and not self._evict_least_recently_used():
+                return None
+        created = self.create()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None and len(self._sessions) < self.max_sessions:
+                self._sessions[key] = created
+                self._start_reaper()
+                return created
+        # Another call created this session (or took the last free place) meanwhile.
+        with created.lock:
+            self.close(created)
+        return session
+
+    def lookup(self, key):
+        """Return key's session without creating one."""
+        with self._lock:
+            return self._sessions.get(key)
+
+    def is_current(self, key, session):
+        """Whether session is still key's session (it may have been closed while a caller waited for its lock)."""
+        with self._lock:
+            return self._sessions.get(key) is session
+
+    def remove(self, key, session):
+        """Close session and forget it. Callers hold session.lock."""
+        with self._lock:
+            if self._sessions.get(key) is session:
+                del self._sessions[key]
+        self.close(session)
+
+    def discard(self, key):
+        """Close key's session once it is not in use. Returns False if there was none."""
+        session = self.lookup(key)
+        if session is None:
+            return False
+        with session.lock:
+            self.remove(key, session)
+        return True
+
+    def close_all(self):
+        self._closed = True
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self.close(session)
+
+    def _evict_least_recently_used(self):
+        # Callers hold _lock; sessions that are in use are skipped. Returns whether one was closed.
+        for key, session in sorted(self._sessions.items(), key=lambda item: item[1].last_used):
+            if session.lock.acquire(blocking=False):
+                try:
+                    del self._sessions[key]
+                    self.close(session)
+                    self._evicted()
+                finally:
+                    session.lock.release()
+                return True
+        return False
+
+    def _start_reaper(self):
+        # Callers hold _lock.
+        if not self._reaper_started and self.idle_timeout > 0:
+            self._reaper_started = True
+            threading.Thread(target=self._evict_idle_sessions, name=f"{self.name}-reaper", daemon=True).start()
+
+    def _evict_idle_sessions(self):
+        while not self._closed:
+            time.sleep(min(60, self.idle_timeout))
+            cutoff = time.monotonic() - self.idle_timeout
+            with self._lock:
+                idle = [(key, session) for key, session in self._sessions.items() if session.last_used < cutoff]
+            for key, session in idle:
+                if session.lock.acquire(blocking=False):
+                    try:
+                        if session.last_used < cutoff:
+                            self.remove(key, session)
+                            self._evicted()
+                    finally:
+                        session.lock.release()
+
+    def _evicted(self):
+        if self.on_evict:
+            self.on_evict()
@@ -0,0 +1,192 @@
+import atexit
+import codecs
+import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+from src.output_capture import BoundedOutput
+from src.session_registry import SessionRegistry, clamp_timeout
+
+logger = logging.getLogger(__name__)
+
+# Shell started for each chat's session.
+SHELL_SESSION_SHELL = os.environ.get("SHELL_SESSION_SHELL", "/bin/bash")
+# Default wall-clock limit in seconds for one execute_shell_command call.
+SHELL_COMMAND_TIMEOUT = float(os.environ.get("SHELL_COMMAND_TIMEOUT", 120))
+# Upper bound on a timeout requested per call (the model cannot lift the limit past this).
+SHELL_COMMAND_MAX_TIMEOUT = float(os.environ.get("SHELL_COMMAND_MAX_TIMEOUT", 600))
+# Seconds a chat's shell may sit unused before it is closed.
+SHELL_SESSION_IDLE_TIMEOUT = float(os.environ.get("SHELL_SESSION_IDLE_TIMEOUT", 900))
+# Shell sessions kept at once; the least recently used idle one is closed to make room.
+SHELL_SESSION_MAX = int(os.environ.get("SHELL_SESSION_MAX", 8))
+
+READ_CHUNK = 65536
+
+
+class ShellSession:
+    """
+    A long-lived shell whose working directory and environment persist between commands.
+
+    Each command is passed to eval through a quoted here-document (so a
+    syntax error fails the command, not the shell), with stdin from
+    /dev/null and stderr merged into stdout. A random end marker printed
+    after it carries the exit status and working directory. The shell leads
+    its own process group, so a command that overruns its timeout is killed
+    together with everything it started; the shell is then restarted in the
+    last known directory, but variables exported in it are lost.
+    """
+
+    def __init__(self, shell=SHELL_SESSION_SHELL, cwd=None):
+        self.shell = shell
+        self.cwd = cwd
+        self.process = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, command, timeout=SHELL_COMMAND_TIMEOUT, on_output=None):
+        """
+        Run command and return {"command", "output", "exit_code", "cwd"}.
+
+        Output is passed to on_output as it arrives and kept within the tool
+        output budget; output_info is added when it was truncated, and
+        timed_out when the command was killed.
+        """
+        if not self.alive:
+            self._start()
+        token = uuid.uuid4().hex
+        marker_name = f"__toolboxai_done_{token}__"
+        self.process.stdin.write((
+            f"__toolboxai_command=$(cat <<'__TOOLBOXAI_EOF_{token}'\n{command}\n__TOOLBOXAI_EOF_{token}\n)\n"
+            f"{{ eval \"$__toolboxai_command\"; }} < /dev/null 2>&1\n"
+            f"printf '\\n{marker_name} %s %s\\n' \"$?\" \"$PWD\"\n"
+        ).encode("utf-8"))
+        self.process.stdin.flush()
+
+        output = BoundedOutput()
+        marker = f"\n{marker_name} "
+        pending = ""
+        result = {"command": command}
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                chunk = self._chunks.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.kill()
+                result["timed_out"] = True
+                result["exit_code"] = None
+                pending += f"\n[Command timed out after {timeout:g}s and was killed; the shell will restart in {self.cwd} without its exported variables.]"
+                break
+            if chunk is None:
+                exit_code = self.process.wait()
+                result["exit_code"] = exit_code
+                pending += f"\n[The shell exited with status {exit_code}; it will restart in {self.cwd} on the next command.]"
+                break
+            pending += chunk
+            end = pending.find(marker)
+            if end >= 0 and pending.find("\n", end + len(marker)) >= 0:
+                status, _, cwd = pending[end + len(marker):].split("\n", 1)[0].partition(" ")
+                result["exit_code"] = int(status)
+                self.cwd = cwd
+                pending = pending[:end]
+                break
+            if end < 0:
+                # Hold back only a last line that could be the start of the marker.
+                split = pending.rfind("\n")
+                if split < 0 or not marker.startswith(pending[split:]):
+                    split = len(pending)
+                ready, pending = pending[:split], pending[split:]
+                self._emit(ready, output, on_output)
+        self._emit(pending, output, on_output)
+        self.last_used = time.monotonic()
+
+        result["output"] = output.getvalue()
+        result["cwd"] = self.cwd
+        if output.truncated:
+            result["output_info"] = output.info()
+        output.close()
+        return result
+
+    def kill(self):
+        # Kill the shell's whole process group, so commands it started go too.
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process = None
+
+    def _start(self):
+        cwd = self.cwd if self.cwd and os.path.isdir(self.cwd) else None
+        self.process = subprocess.Popen([self.shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, cwd=cwd, start_new_session=True)
+        self._chunks = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process.stdout, self._chunks),
+                         name="shell-session-reader", daemon=True).start()
+        logger.info(f"Started shell session {self.process.pid} in {cwd or os.getcwd()}")
+
+    @staticmethod
+    def _read(stdout, chunks):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for data in iter(lambda: os.read(stdout.fileno(), READ_CHUNK), b""):
+            chunks.put(decoder.decode(data))
+        rest = decoder.decode(b"", final=True)
+        if rest:
+            chunks.put(rest)
+        chunks.put(None)
+        stdout.close()
+
+    @staticmethod
+    def _emit(text, output, on_output):
+        if text:
+            output.write(text)
+            if on_output:
+                on_output(text)
+
+
+_sessions = SessionRegistry(ShellSession, ShellSession.kill, SHELL_SESSION_MAX, SHELL_SESSION_IDLE_TIMEOUT,
+                            name="shell-session")
+
+
+def run_shell_command(command, timeout=None, chat_id=None, on_output=None):
+    """Run command in the chat's shell session (a one-off shell when there is no chat)."""
+    timeout = command_timeout(timeout)
+    if not chat_id:
+        session = ShellSession()
+        try:
+            return session.run(command, timeout, on_output)
+        finally:
+            session.kill()
+    while True:
+        session = _sessions.get(chat_id)
+        if session is None:
+            return {"command": command, "output": "", "exit_code": None,
+                    "error": f"All {SHELL_SESSION_MAX} shell sessions are busy. Try again shortly."}
+        with session.lock:
+            if not _sessions.is_current(chat_id, session):
+                continue  # Closed while we waited for it; start a new one.
+            return session.run(command, timeout, on_output)
+
+
+def command_timeout(timeout=None):
+    """Clamp a requested timeout (from tool input) to [MIN_TIMEOUT, SHELL_COMMAND_MAX_TIMEOUT]."""
+    return clamp_timeout(timeout, SHELL_COMMAND_TIMEOUT, SHELL_COMMAND_MAX_TIMEOUT)
+
+
+def close_shell_session(chat_id):
+    """Kill a chat's shell session, if it has one."""
+    _sessions.discard(chat_id)
+
+
+atexit.register(_sessions.close_all)
@@ -0,0 +1,96 @@
+THINKING_OPEN = "<thinking>"
+THINKING_CLOSE = "</thinking>"
+ANSWER_OPEN = "<answer>"
+ANSWER_CLOSE = "</answer>"
+
+_TAGS = (THINKING_OPEN, THINKING_CLOSE, ANSWER_OPEN, ANSWER_CLOSE)
+_TAG_PREFIXES = {tag[:i] for tag in _TAGS for i in range(1, len(tag))}
+
+
+class TagStreamParser:
+    """
+    Incremental parser for <thinking>/<answer> tagged model output.
+
+    Each delta is scanned once. Tags split across chunk boundaries are held
+    back until they can be resolved, thinking text is kept out of the visible
+    answer and answer tags are stripped, so per-chunk cost does not depend on
+    how much has already been streamed. As before, text outside thinking that
+    precedes an <answer> tag is dropped when the tag arrives.
+
+    New answer text is only joined onto the accumulated answer when answer is
+    read, so callers that render on a throttle pay for the join per render,
+    not per chunk.
+    """
+
+    def __init__(self):
+        self.is_thinking = False
+        self._pending = ""
+        self._answer = ""
+        self._answer_parts = []
+        self._thinking_parts = []
+        self._answer_started = False
+
+    def feed(self, chunk):
+        """Consume a text delta and return the newly visible answer text."""
+        text = self._pending + chunk
+        self._pending = ""
+        visible = []
+        start = 0
+        pos = text.find("<")
+        while pos != -1:
+            self._emit(text[start:pos], visible)
+            tag = next((t for t in _TAGS if text.startswith(t, pos)), None)
+            if tag:
+                if tag == THINKING_OPEN:
+                    self.is_thinking = True
+                elif tag == THINKING_CLOSE:
+                    self.is_thinking = False
+                elif tag == ANSWER_OPEN and not self.is_thinking:
+                    self._answer = ""
+                    self._answer_parts = []
+                    self._answer_started = False
+                    visible.clear()
+                start = pos + len(tag)
+            elif text[pos:] in _TAG_PREFIXES:
+                # Possibly the start of a tag that finishes in the next chunk.
+                self._pending = text[pos:]
+                start = len(text)
+                break
+            else:
+                self._emit("<", visible)
+                start = pos + 1
+            pos = text.find("<", start)
+        self._emit(text[start:], visible)
+        return "".join(visible)
+
+    def flush(self):
+        """Release any held-back partial tag at the end of the stream."""
+        text, self._pending = self._pending, ""
+        visible = []
+        self._emit(text, visible)
+        return "".join(visible)
+
+    def _emit(self, text, visible):
+        if not text:
+            return
+        if self.is_thinking:
+            self._thinking_parts.append(text)
+            return
+        if not self._answer_started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._answer_started = True
+        self._answer_parts.append(text)
+        visible.append(text)
+
+    @property
+    def answer(self):
+        if self._answer_parts:
+            self._answer += "".join(self._answer_parts)
+            self._answer_parts = []
+        return self._answer.rstrip()
+
+    @property
+    def thinking(self):
+        return "".join(self._thinking_parts)
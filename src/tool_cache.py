@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Seconds a result stays fresh, per tool. Tools not listed here are never cached.
+TOOL_CACHE_TTLS = {
+    "search": 300,
+    "webscrape": 600,
+    "rss_feed": 600,
+    "get_crypto_price": 15,
+    "get_stock_price": 15,
+    "market_sentiment_analysis": 300,
+    "explain_financial_term": 86400,
+}
+TOOL_CACHE_MAX_ENTRIES = int(os.environ.get("TOOL_CACHE_MAX_ENTRIES", 512))
+# Set to a directory to keep results across restarts and share them between processes.
+TOOL_CACHE_DIR = os.environ.get("TOOL_CACHE_DIR")
+
+
+class ToolResultCache:
+    """
+    Thread-safe TTL + LRU cache for tool results with single-flight loading.
+
+    Concurrent calls with the same tool name and input share one in-flight
+    fetch; exceptions and None results are not cached, so cached tools must
+    signal failure that way rather than with an error string. When disk_dir is set,
+    entries are also written there as JSON and read back on a memory miss.
+    """
+
+    def __init__(self, ttls=None, max_entries=TOOL_CACHE_MAX_ENTRIES, disk_dir=TOOL_CACHE_DIR):
+        self.ttls = TOOL_CACHE_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "shared": 0}
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get_or_call(self, tool_name, tool_input, fn):
+        ttl = self.ttls.get(tool_name)
+        if not ttl:
+            return fn()
+
+        key = self._make_key(tool_name, tool_input)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            future = self._in_flight.get(key)
+            if future:
+                self.stats["shared"] += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            expires, value = self._read_disk(key, now)
+            if value is None:
+                with self._lock:
+                    self.stats["misses"] += 1
+                expires, value = now + ttl, fn()
+                self._write_disk(key, expires, value)
+            else:
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+            # Tools return None or raise when the upstream call failed; don't pin that.
+            if value is not None:
+                with self._lock:
+                    self._entries[key] = (expires, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _make_key(tool_name, tool_input):
+        payload = json.dumps([tool_name, tool_input], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None, None
+        path = os.path.join(self.disk_dir, f"{key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        if entry.get("expires", 0) <= now:
+            return None, None
+        return entry["expires"], entry.get("value")
+
+    def _write_disk(self, key, expires, value):
+        if not self.disk_dir or value is None:
+            return
+        path = os.path.join(self.disk_dir, f"{key}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires": expires, "value": value}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write tool cache entry: {e}")
+
+
+tool_cache = ToolResultCache()
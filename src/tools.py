@@ -1,13 +1,13 @@
-import requests
 import json
 from bs4 import BeautifulSoup
 from duckduckgo_search import DDGS
 import feedparser
-from src.memory_manager import MemoryManager
+from src.memory_manager import MemoryManager, using_memory_manager
 import logging
-import json
-import logging
-import boto3
+from src.bedrock_client import get_client
+from src.tool_cache import tool_cache
+from src.http_client import http_get
+from src.output_capture import read_tool_output
 from src.finance_manager import (
     get_stock_price,
     calculate_roi,
@@ -17,13 +17,26 @@ from src.finance_manager import (
     explain_financial_term,
     compare_financial_apps
 )
-from .python_repl import execute_python_code
-import subprocess
+from .python_repl import execute_python_code, inspect_python_session, reset_python_session
+from src.chat_context import get_current_chat
+from src.shell_session import run_shell_command
+from concurrent.futures import ThreadPoolExecutor, wait
+import codecs
+import contextvars
+import os
+import re
+import uuid
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-memory_manager = MemoryManager()
+# Shared by all sessions so concurrent tool calls stay bounded process-wide.
+MAX_TOOL_WORKERS = int(os.environ.get("MAX_TOOL_WORKERS", 8))
+tool_executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="tool-call")
+# Where the running tool call reports live output (a ToolProgress), if the caller displays it.
+current_tool_progress = contextvars.ContextVar("tool_progress", default=None)
+# Records the results of tool calls submitted from this context (a ConversationRecorder), if set.
+current_tool_recorder = contextvars.ContextVar("tool_recorder", default=None)
 
 def search_duckduckgo(query, region='wt-wt', safesearch='off', max_results=5):
     """DuckDuckGo web search."""
@@ -31,12 +44,16 @@ def search_duckduckgo(query, region='wt-wt', safesearch='off', max_results=5):
 
 def scrape_webpage(url):
     """Extract text from webpage."""
-    return BeautifulSoup(requests.get(url).text, 'html.parser').get_text(separator='\n', strip=True)
+    response = http_get(url, tool="webscrape")
+    response.raise_for_status()
+    return BeautifulSoup(response.text, 'html.parser').get_text(separator='\n', strip=True)
 
 def fetch_rss_feed(url, num_entries=5):
     """Fetch RSS feed entries."""
     try:
-        feed = feedparser.parse(url)
+        response = http_get(url, tool="rss_feed")
+        response.raise_for_status()
+        feed = feedparser.parse(response.content)
         return [
             {
                 'title': entry.get('title', 'No title'),
@@ -53,57 +70,59 @@ def fetch_rss_feed(url, num_entries=5):
 def get_crypto_price(symbol):
     """Get current price of a cryptocurrency."""
     url = f"https://api.coingecko.com/api/v3/simple/price?ids={symbol}&vs_currencies=usd"
-    response = requests.get(url)
+    response = http_get(url, tool="get_crypto_price")
     if response.status_code == 200:
         data = response.json()
         return data.get(symbol, {}).get('usd')
     else:
         return None
 
-def execute_shell_command(command: str) -> str:
-    """Execute a shell command and return the input command and output."""
-    try:
-        result = subprocess.run(command, shell=True, check=True, text=True, capture_output=True)
-        output = result.stdout
-    except subprocess.CalledProcessError as e:
-        output = f"Error executing command: {e}\nStderr: {e.stderr}"
-    
-    return json.dumps({
-        "command": command,
-        "output": output
-    })
+def execute_shell_command(command: str, timeout=None, chat_id=None, on_output=None) -> dict:
+    """Execute a shell command in the chat's persistent shell session, killing it after timeout seconds."""
+    return run_shell_command(command, timeout, chat_id, on_output)
 
-import boto3
-
-DEFAULT_SESSION_ID = "CogniscentAI-Main-Session"
 DEFAULT_REGION = "us-west-2"  # You can change this to your preferred default region
+AGENT_SESSION_ID_CHARS = re.compile(r"[^0-9A-Za-z._:-]")
+MAX_AGENT_SESSION_ID_LENGTH = 100
+
+def agent_session_id(session_id=None, chat_id=None):
+    """Return the agent session id for a call, scoped to the chat so chats never share agent sessions."""
+    if not chat_id:
+        scoped = session_id or uuid.uuid4().hex
+    elif session_id:
+        scoped = f"{chat_id}:{session_id}"
+    else:
+        scoped = chat_id
+    return AGENT_SESSION_ID_CHARS.sub("-", scoped)[:MAX_AGENT_SESSION_ID_LENGTH]
 
-def consult_agent(input_text, session_id=None, region=None):
+def consult_agent(input_text, session_id=None, region=None, chat_id=None, on_output=None, client=None):
+    """Ask the Bedrock agent; returns the response and the session_id to pass to continue the session."""
     if not region:
         region = DEFAULT_REGION
     
-    bedrock = boto3.client('bedrock-agent-runtime', region_name=region)
-    
-    if not session_id:
-        session_id = DEFAULT_SESSION_ID
+    bedrock = client or get_client('bedrock-agent-runtime', region)
+    scoped_id = agent_session_id(session_id, chat_id)
     
     try:
         response = bedrock.invoke_agent(
             agentAliasId='HBC1BIIRQG',
             agentId='NG7BOZJ9TN',
-            sessionId=session_id,
+            sessionId=scoped_id,
             inputText=input_text
         )
         
-        event_stream = response['completion']
-        full_response = ""
-        for event in event_stream:
-            if 'chunk' in event:
-                chunk = event['chunk']
-                if 'bytes' in chunk:
-                    full_response += chunk['bytes'].decode('utf-8')
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        parts = []
+        for event in response['completion']:
+            chunk = event.get('chunk')
+            if chunk and 'bytes' in chunk:
+                text = decoder.decode(chunk['bytes'])
+                parts.append(text)
+                if on_output and text:
+                    on_output(text)
+        parts.append(decoder.decode(b"", final=True))
         
-        return {"response": full_response, "session_id": session_id}
+        return {"response": "".join(parts), "session_id": session_id if chat_id else scoped_id}
     except Exception as e:
         raise Exception(f"Error in consult_agent: {str(e)}")
 
@@ -112,41 +131,78 @@ def process_tool_call(tool_name, tool_input):
     logger.info(f"Tool call: {tool_name}")
     try:
         if tool_name == "search":
-            result = search_duckduckgo(tool_input["query"])
+            result = tool_cache.get_or_call(tool_name, tool_input, lambda: search_duckduckgo(tool_input["query"]))
         elif tool_name == "webscrape":
-            result = scrape_webpage(tool_input["url"])
+            result = tool_cache.get_or_call(tool_name, tool_input, lambda: scrape_webpage(tool_input["url"]))
         elif tool_name == "rss_feed":
-            result = fetch_rss_feed(tool_input["url"], tool_input.get("num_entries", 5))
+            result = tool_cache.get_or_call(tool_name, tool_input, lambda: fetch_rss_feed(tool_input["url"], tool_input.get("num_entries", 5)))
         elif tool_name == "get_crypto_price":
-            result = get_crypto_price(tool_input["symbol"])
+            result = tool_cache.get_or_call(tool_name, tool_input, lambda: get_crypto_price(tool_input["symbol"]))
         elif tool_name == "get_stock_price":
-            result = get_stock_price(tool_input["ticker"])
+            result = tool_cache.get_or_call(tool_name, tool_input, lambda: get_stock_price(tool_input["ticker"]))
         elif tool_name == "calculate_roi":
             result = calculate_roi(tool_input["initial_investment"], tool_input["final_value"])
         elif tool_name == "market_sentiment_analysis":
-            result = market_sentiment_analysis(tool_input["keyword"])
+            result = tool_cache.get_or_call(tool_name, tool_input, lambda: market_sentiment_analysis(tool_input["keyword"]))
         elif tool_name == "check_platform_status":
             result = check_platform_status(tool_input["platform_name"])
         elif tool_name == "simulate_trade":
             result = simulate_trade(tool_input["platform"], tool_input["asset"], tool_input["amount"], tool_input["action"])
         elif tool_name == "explain_financial_term":
-            result = explain_financial_term(tool_input["term"])
+            result = tool_cache.get_or_call(tool_name, tool_input, lambda: explain_financial_term(tool_input["term"]))
         elif tool_name == "compare_financial_apps":
             result = compare_financial_apps(tool_input["app1"], tool_input["app2"], tool_input["feature"])
         elif tool_name == "execute_python_code":
-            result = execute_python_code(tool_input["code"])
+            session_id = get_current_chat() if tool_input.get("persistent") else None
+            result = execute_python_code(tool_input["code"], tool_input.get("timeout"), session_id)
+        elif tool_name == "read_tool_output":
+            result = read_tool_output(tool_input["artifact"], tool_input.get("offset", 0))
+        elif tool_name == "inspect_python_session":
+            result = inspect_python_session(get_current_chat())
+        elif tool_name == "reset_python_session":
+            result = reset_python_session(get_current_chat())
         elif tool_name == "execute_shell_command":
-            result = execute_shell_command(tool_input["command"])
+            progress = current_tool_progress.get()
+            result = execute_shell_command(tool_input["command"], tool_input.get("timeout"), get_current_chat(),
+                                           progress.write if progress else None)
         elif tool_name == "consult_agent":
-            result = consult_agent(tool_input["input_text"], tool_input.get("session_id"))
-        elif hasattr(memory_manager, tool_name):
-            result = getattr(memory_manager, tool_name)(**tool_input)
+            progress = current_tool_progress.get()
+            result = consult_agent(tool_input["input_text"], tool_input.get("session_id"), chat_id=get_current_chat(),
+                                   on_output=progress.write if progress else None)
+        elif hasattr(MemoryManager, tool_name):
+            with using_memory_manager() as manager:
+                result = getattr(manager, tool_name)(**tool_input)
         else:
             return json.dumps({"error": f"Unknown tool: {tool_name}"})
         return json.dumps({"result": result})
     except Exception as e:
         return json.dumps({"error": f"Error in {tool_name}: {str(e)}"})
 
+def tool_call_order_key(tool_name, tool_input):
+    """Return the per-chat state a tool call depends on (calls sharing it run in order), or None."""
+    if tool_name == "execute_shell_command":
+        return "shell"
+    if tool_name in ("execute_python_code", "inspect_python_session", "reset_python_session") and (
+            tool_name != "execute_python_code" or tool_input.get("persistent")):
+        return "python_session"
+    return None
+
+def submit_tool_call(tool_name, tool_input, progress=None, after=None):
+    """Run process_tool_call on the shared tool executor in the caller's context, once the future after (if any) is done."""
+    context = contextvars.copy_context()
+    context.run(current_tool_progress.set, progress)
+    return tool_executor.submit(context.run, _run_after, after, tool_name, tool_input)
+
+def _run_after(after, tool_name, tool_input):
+    # Futures are started in submission order, so the one waited on is already running or done.
+    if after is not None:
+        wait([after])
+    result = process_tool_call(tool_name, tool_input)
+    recorder = current_tool_recorder.get()
+    if recorder is not None:
+        recorder.record_tool_call(tool_name, tool_input, result)
+    return result
+
 # Define all available tools
 ALL_TOOLS = {
     'get_user_profile': {
@@ -183,18 +239,88 @@ ALL_TOOLS = {
     },
     'recall_memories': {
         'name': 'recall_memories',
-        'description': 'Search stored memories by similarity. Use to retrieve relevant past information.',
+        'description': 'Search stored memories by meaning and exact keywords (URLs, tickers, names). Use to retrieve relevant past information.',
         'inputSchema': {
             'json': {
                 'type': 'object',
                 'properties': {
                     'query': {'type': 'string', 'description': 'Search query'},
-                    'k': {'type': 'integer', 'description': 'Number of results', 'default': 3}
+                    'k': {'type': 'integer', 'description': 'Number of results', 'default': 3},
+                    'where': {'type': 'object', 'description': 'Optional metadata filter, e.g. {"category": "rss_feed"}'}
                 },
                 'required': ['query']
             }
         }
     },
+    'save_memories': {
+        'name': 'save_memories',
+        'description': 'Save several memories in one call. Prefer over repeated save_memory calls when storing multiple facts.',
+        'inputSchema': {
+            'json': {
+                'type': 'object',
+                'properties': {
+                    'memories': {
+                        'type': 'array',
+                        'description': 'Memories to save',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'text': {'type': 'string', 'description': 'Content to save'},
+                                'metadata': {'type': 'object', 'description': 'Optional categorization metadata'}
+                            },
+                            'required': ['text']
+                        }
+                    }
+                },
+                'required': ['memories']
+            }
+        }
+    },
+    'recall_memories_batch': {
+        'name': 'recall_memories_batch',
+        'description': 'Run several memory searches in one call. Returns results per query. Prefer over repeated recall_memories calls.',
+        'inputSchema': {
+            'json': {
+                'type': 'object',
+                'properties': {
+                    'queries': {'type': 'array', 'items': {'type': 'string'}, 'description': 'Search queries'},
+                    'k': {'type': 'integer', 'description': 'Number of results per query', 'default': 3},
+                    'where': {'type': 'object', 'description': 'Optional metadata filter applied to every query'}
+                },
+                'required': ['queries']
+            }
+        }
+    },
+    'list_all_memories': {
+        'name': 'list_all_memories',
+        'description': 'List stored memories a page at a time (ID and preview by default). Use recall_memories to search instead.',
+        'inputSchema': {
+            'json': {
+                'type': 'object',
+                'properties': {
+                    'limit': {'type': 'integer', 'description': 'Memories per page (max 100)', 'default': 20},
+                    'cursor': {'type': 'string', 'description': 'Cursor returned by the previous page'},
+                    'where': {'type': 'object', 'description': 'Optional metadata filter, e.g. {"category": "task_history"}'},
+                    'created_after': {'type': 'string', 'description': 'Optional ISO date, e.g. 2024-07-01'},
+                    'created_before': {'type': 'string', 'description': 'Optional ISO date'},
+                    'compact': {'type': 'boolean', 'description': 'Show only ID and a short preview', 'default': True}
+                }
+            }
+        }
+    },
+    'compact_memories': {
+        'name': 'compact_memories',
+        'description': 'Merge near-duplicate memories (keeping every text) and evict stale or rarely recalled ones. Reports what would change by default; pass dry_run=false to apply.',
+        'inputSchema': {
+            'json': {
+                'type': 'object',
+                'properties': {
+                    'dry_run': {'type': 'boolean', 'description': 'Only report what would be merged and reclaimed', 'default': True},
+                    'similarity_threshold': {'type': 'number', 'description': 'Cosine similarity at which memories count as duplicates (0-1)'}
+                }
+            }
+        }
+    },
     'search': {
         'name': 'search',
         'description': 'Web search for current info, news, or facts. Use for up-to-date or factual information.',
@@ -347,25 +473,52 @@ ALL_TOOLS = {
     },
     'execute_python_code': {
         'name': 'execute_python_code',
-        'description': 'Execute Python code and return the result, output, and any errors.',
+        'description': 'Execute Python code in an isolated worker process and return the result, output, and any errors. Runs are killed after a timeout or if they use too much memory.',
         'inputSchema': {
             'json': {
                 'type': 'object',
                 'properties': {
-                    'code': {'type': 'string', 'description': 'Python code to execute'}
+                    'code': {'type': 'string', 'description': 'Python code to execute'},
+                    'timeout': {'type': 'number', 'description': 'Optional wall-clock limit in seconds (default 30, at most 120)'},
+                    'persistent': {'type': 'boolean', 'description': 'Run in this chat\'s Python session, keeping variables, imports and loaded data between calls', 'default': False}
                 },
                 'required': ['code']
             }
         }
     },
+    'read_tool_output': {
+        'name': 'read_tool_output',
+        'description': 'Page through the full output of an earlier execute_python_code or execute_shell_command call whose output was truncated.',
+        'inputSchema': {
+            'json': {
+                'type': 'object',
+                'properties': {
+                    'artifact': {'type': 'string', 'description': 'Artifact id from the truncated output'},
+                    'offset': {'type': 'integer', 'description': 'Byte offset to start from (next_offset of the previous page)', 'default': 0}
+                },
+                'required': ['artifact']
+            }
+        }
+    },
+    'inspect_python_session': {
+        'name': 'inspect_python_session',
+        'description': 'List the variables in this chat\'s persistent Python session (name, type, short preview).',
+        'inputSchema': {'json': {'type': 'object', 'properties': {}}}
+    },
+    'reset_python_session': {
+        'name': 'reset_python_session',
+        'description': 'Discard this chat\'s persistent Python session and all its variables.',
+        'inputSchema': {'json': {'type': 'object', 'properties': {}}}
+    },
     'execute_shell_command': {
         'name': 'execute_shell_command',
-        'description': 'Execute a shell command in the Docker environment. Returns both the input command and its output.',
+        'description': 'Execute a shell command in the Docker environment. Runs in a shell kept for this chat, so cd and export carry over to later calls (several calls in one message run one after another, in order). Returns the command, its combined stdout/stderr, exit_code and the working directory afterwards.',
         'inputSchema': {
             'json': {
                 'type': 'object',
                 'properties': {
-                    'command': {'type': 'string', 'description': 'The shell command to execute'}
+                    'command': {'type': 'string', 'description': 'The shell command to execute'},
+                    'timeout': {'type': 'number', 'description': 'Optional. Seconds before the command is killed (default 120, at most 600)'}
                 },
                 'required': ['command']
             }
@@ -379,7 +532,7 @@ ALL_TOOLS = {
                 'type': 'object',
                 'properties': {
                     'input_text': {'type': 'string', 'description': 'The question or task for the AI agent'},
-                    'session_id': {'type': 'string', 'description': 'Optional. Use the same session_id for related queries to maintain context'}
+                    'session_id': {'type': 'string', 'description': 'Optional. Use the same session_id for related queries to maintain context; without one, the agent keeps one session for this chat'}
                 },
                 'required': ['input_text']
             }
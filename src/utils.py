@@ -1,13 +1,66 @@
+import os
 import random
 import json
+import logging
+import time
+import uuid
 import streamlit as st
+from src.memory_manager import DEFAULT_TENANT
+from src.chat_context import new_chat_id
+from src.kernel_pool import close_python_session
+from src.shell_session import close_shell_session
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between re-renders of a streaming placeholder.
+RENDER_INTERVAL = float(os.environ.get("STREAM_RENDER_INTERVAL", 0.05))
+# Request header carrying the user's identity when an auth proxy sits in front of the app.
+MEMORY_TENANT_HEADER = os.environ.get("MEMORY_TENANT_HEADER")
+# Memory tenant for users with no identity: "default" shares one store, "session" isolates each browser session.
+# Left unset, "default" is used with a warning, since every visitor then sees the same memories.
+MEMORY_TENANT_FALLBACK = os.environ.get("MEMORY_TENANT_FALLBACK")
+
+_shared_tenant_warned = False
+
+def resolve_tenant_id():
+    """Pick the memory tenant for this session: logged-in user, then proxy header, then the fallback."""
+    try:
+        if st.user.is_logged_in:
+            return st.user.get("email") or st.user.get("sub")
+    except Exception:
+        pass  # Authentication is not configured.
+    if MEMORY_TENANT_HEADER:
+        user = st.context.headers.get(MEMORY_TENANT_HEADER)
+        if user:
+            return user
+    if MEMORY_TENANT_FALLBACK == "session":
+        return f"session-{uuid.uuid4().hex}"
+    if MEMORY_TENANT_FALLBACK is None:
+        _warn_shared_tenant()
+    return DEFAULT_TENANT
+
+def _warn_shared_tenant():
+    global _shared_tenant_warned
+    if not _shared_tenant_warned:
+        _shared_tenant_warned = True
+        logger.warning(
+            "No memory tenant source is configured (Streamlit auth or MEMORY_TENANT_HEADER): every user shares "
+            "the default memory store. Set MEMORY_TENANT_FALLBACK=session to isolate browser sessions, "
+            "or MEMORY_TENANT_FALLBACK=default to keep one shared store and silence this warning."
+        )
 
 def new_chat():
+    close_python_session(st.session_state.get("chat_id"))
+    close_shell_session(st.session_state.get("chat_id"))
+    st.session_state.chat_id = new_chat_id()
     st.session_state.messages = []
     st.session_state.history = []
     st.session_state.display_messages = []
     st.session_state['uploader_key'] = random.randint(1, 100000)
     st.session_state.token_usage = None
+    st.session_state.history_tokens_saved = 0
+    st.session_state.turn_history_tokens_saved = 0
+    st.session_state.pop("user_profile", None)
     # Reset the total token usage
     st.session_state.total_token_usage = {
         'inputTokens': 0,
@@ -38,6 +91,41 @@ def handle_chat_output(delta, message_placeholder, full_response, answer_content
     
     return full_response, answer_content, is_thinking
 
+class ThrottledPlaceholder:
+    """
+    Wrap a Streamlit placeholder so rapid streaming updates are coalesced.
+
+    Each call to markdown() only records the latest body; it is rendered at
+    most once per interval, and flush() renders whatever is still pending
+    (call it at the end of a content block). The body may be a callable so
+    that building the text is also deferred until a render actually happens.
+    """
+
+    def __init__(self, placeholder, interval=RENDER_INTERVAL):
+        self._placeholder = placeholder
+        self.interval = interval
+        self._pending = None
+        self._last_render = 0.0
+        self.render_count = 0
+
+    def markdown(self, body):
+        self._pending = body
+        if time.monotonic() - self._last_render >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending is None:
+            return
+        body = self._pending() if callable(self._pending) else self._pending
+        self._pending = None
+        self._placeholder.markdown(body)
+        self._last_render = time.monotonic()
+        self.render_count += 1
+
+    def empty(self):
+        self._pending = None
+        self._placeholder.empty()
+
 def handle_tool_use(delta, tool_input_placeholder, full_tool_input, is_final=True):
     if 'input' in delta['toolUse']:
         text_chunk = delta['toolUse']['input']
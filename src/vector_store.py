@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class NumpyCollection:
+    """
+    Local vector collection backed by an append-only, memory-mapped embedding matrix.
+
+    Implements the subset of the Chroma collection API that MemoryManager
+    uses (add/get/query/update/delete/count), so either backend can sit under
+    it, plus vacuum() to reclaim the space of deleted rows. Embeddings are L2-normalized and appended to a float32 (or, with
+    quantize=True, int8 plus per-row scale) file that is searched with one
+    vectorized dot product per query. Ids, documents and metadata live in a
+    JSON-lines operation log next to it, replayed on open. Distances are
+    squared L2 between unit vectors (2 - 2 * cosine), matching Chroma's
+    default space.
+    """
+
+    def __init__(self, path, embedding_function=None, quantize=False):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.quantize = quantize
+        self.dim = None
+        self._lock = threading.RLock()
+        self._ids = []           # row -> id
+        self._rows = {}          # id -> current row
+        self._documents = {}
+        self._metadatas = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._matrix = None
+        self._scales = None
+        self._mapped_rows = 0
+        os.makedirs(path, exist_ok=True)
+        suffix = "i8" if quantize else "f32"
+        self._vectors_path = os.path.join(path, f"embeddings.{suffix}")
+        self._scales_path = os.path.join(path, "scales.f32")
+        self._log_path = os.path.join(path, "records.jsonl")
+        self._meta_path = os.path.join(path, "index.json")
+        self._load()
+
+    # -- Chroma-compatible API -------------------------------------------------
+
+    def count(self):
+        with self._lock:
+            return len(self._rows)
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        vectors = self._embed(documents, embeddings)
+        with self._lock:
+            duplicates = [memory_id for memory_id in ids if memory_id in self._rows]
+            if duplicates:
+                raise ValueError(f"IDs already exist: {duplicates}")
+            rows = self._append_vectors(vectors)
+            records = [
+                {"op": "add", "id": memory_id, "row": row, "document": document, "metadata": metadata}
+                for memory_id, row, document, metadata in zip(ids, rows, documents, metadatas)
+            ]
+            for record in records:
+                self._apply(record)
+            self._append_log(records)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        with self._lock:
+            existing = [memory_id for memory_id in ids if memory_id in self._rows]
+        if existing:
+            self.delete(ids=existing)
+        self.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        records = []
+        rows = [None] * len(ids)
+        if documents is not None or embeddings is not None:
+            vectors = self._embed(documents, embeddings)
+        with self._lock:
+            missing = [memory_id for memory_id in ids if memory_id not in self._rows]
+            if missing:
+                logger.warning(f"Update of missing ids ignored: {missing}")
+            if documents is not None or embeddings is not None:
+                rows = self._append_vectors(vectors)
+            for i, memory_id in enumerate(ids):
+                if memory_id not in self._rows:
+                    continue
+                record = {"op": "update", "id": memory_id}
+                if rows[i] is not None:
+                    record["row"] = rows[i]
+                if documents is not None:
+                    record["document"] = documents[i]
+                if metadatas is not None:
+                    record["metadata"] = metadatas[i]
+                self._apply(record)
+                records.append(record)
+            self._append_log(records)
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if ids is None:
+                ids = self._select(None, where)
+            records = [{"op": "delete", "id": memory_id} for memory_id in ids if memory_id in self._rows]
+            for record in records:
+                self._apply(record)
+            self._append_log(records)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        with self._lock:
+            selected = self._select(ids, where)
+            start = offset or 0
+            selected = selected[start:start + limit] if limit is not None else selected[start:]
+            return {
+                "ids": selected,
+                "documents": [self._documents[memory_id] for memory_id in selected],
+                "metadatas": [self._metadatas[memory_id] for memory_id in selected],
+            }
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None, include=None):
+        queries = self._embed(query_texts, query_embeddings)
+        with self._lock:
+            self._refresh_map()
+            result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            if not self._rows:
+                for _ in range(len(queries)):
+                    for key in result:
+                        result[key].append([])
+                return result
+            mask = self._live[:self._mapped_rows].copy()
+            if where:
+                allowed = np.zeros_like(mask)
+                for memory_id in self._select(None, where):
+                    allowed[self._rows[memory_id]] = True
+                mask &= allowed
+            scores = self._scores(queries)
+            scores[:, ~mask] = -np.inf
+            k = min(n_results, int(mask.sum()))
+            for row_scores in scores:
+                if k == 0:
+                    top = []
+                else:
+                    top = np.argpartition(-row_scores, k - 1)[:k]
+                    top = top[np.argsort(-row_scores[top])]
+                ids = [self._ids[row] for row in top]
+                result["ids"].append(ids)
+                result["documents"].append([self._documents[memory_id] for memory_id in ids])
+                result["metadatas"].append([self._metadatas[memory_id] for memory_id in ids])
+                result["distances"].append([float(2.0 - 2.0 * row_scores[row]) for row in top])
+            return result
+
+    def vacuum(self):
+        """
+        Rewrite the embedding file and operation log with only live rows.
+
+        Deleted and superseded rows are otherwise kept on disk (the files are
+        append-only). Returns the number of bytes freed.
+        """
+        with self._lock:
+            before = self.storage_bytes()
+            if self.dim is None:
+                return 0
+            self._refresh_map()
+            live_ids = sorted(self._rows, key=self._rows.get)
+            rows = [self._rows[memory_id] for memory_id in live_ids]
+            with open(self._vectors_path + ".tmp", "wb") as f:
+                f.write(np.asarray(self._matrix[rows]).tobytes() if rows else b"")
+            if self.quantize:
+                with open(self._scales_path + ".tmp", "wb") as f:
+                    f.write(np.asarray(self._scales[rows]).tobytes() if rows else b"")
+            with open(self._log_path + ".tmp", "w", encoding="utf-8") as f:
+                for row, memory_id in enumerate(live_ids):
+                    record = {"op": "add", "id": memory_id, "row": row,
+                              "document": self._documents[memory_id], "metadata": self._metadatas[memory_id]}
+                    f.write(json.dumps(record) + "\n")
+            # Drop the memory maps before swapping the files underneath them.
+            self._matrix = None
+            self._scales = None
+            self._mapped_rows = 0
+            os.replace(self._vectors_path + ".tmp", self._vectors_path)
+            if self.quantize:
+                os.replace(self._scales_path + ".tmp", self._scales_path)
+            os.replace(self._log_path + ".tmp", self._log_path)
+            self._ids = list(live_ids)
+            self._rows = {memory_id: row for row, memory_id in enumerate(live_ids)}
+            self._live = np.ones(len(live_ids), dtype=bool)
+            return before - self.storage_bytes()
+
+    def storage_bytes(self):
+        paths = [self._vectors_path, self._scales_path, self._log_path, self._meta_path]
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    # -- storage ---------------------------------------------------------------
+
+    def _embed(self, documents, embeddings):
+        if embeddings is None:
+            if self.embedding_function is None:
+                raise ValueError("No embeddings given and no embedding function configured")
+            embeddings = self.embedding_function(list(documents))
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _append_vectors(self, vectors):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "quantize": self.quantize}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+        first_row = len(self._ids)
+        if self.quantize:
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+            with open(self._vectors_path, "ab") as f:
+                f.write(quantized.tobytes())
+            with open(self._scales_path, "ab") as f:
+                f.write(scales.astype(np.float32).tobytes())
+        else:
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+        rows = list(range(first_row, first_row + len(vectors)))
+        self._ids.extend([None] * len(vectors))
+        self._live = np.concatenate([self._live, np.zeros(len(vectors), dtype=bool)])
+        return rows
+
+    def _refresh_map(self):
+        rows = len(self._ids)
+        if rows == self._mapped_rows or self.dim is None:
+            return
+        dtype = np.int8 if self.quantize else np.float32
+        self._matrix = np.memmap(self._vectors_path, dtype=dtype, mode="r", shape=(rows, self.dim))
+        if self.quantize:
+            self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(rows,))
+        self._mapped_rows = rows
+
+    def _scores(self, queries):
+        if not self.quantize:
+            return queries @ self._matrix.T
+        # Dequantize in blocks so the int8 index never has to be expanded whole.
+        scores = np.empty((len(queries), self._mapped_rows), dtype=np.float32)
+        block = 65536
+        for start in range(0, self._mapped_rows, block):
+            chunk = np.asarray(self._matrix[start:start + block], dtype=np.float32)
+            scores[:, start:start + block] = (queries @ chunk.T) * self._scales[start:start + block]
+        return scores
+
+    def _append_log(self, records):
+        if not records:
+            return
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def _apply(self, record):
+        memory_id = record["id"]
+        if record["op"] == "delete":
+            row = self._rows.pop(memory_id, None)
+            if row is not None:
+                self._live[row] = False
+            self._documents.pop(memory_id, None)
+            self._metadatas.pop(memory_id, None)
+            return
+        if "row" in record:
+            old_row = self._rows.get(memory_id)
+            if old_row is not None:
+                self._live[old_row] = False
+            self._rows[memory_id] = record["row"]
+            self._ids[record["row"]] = memory_id
+            self._live[record["row"]] = True
+        if record["op"] == "add" or "document" in record:
+            self._documents[memory_id] = record.get("document")
+        if record["op"] == "add" or "metadata" in record:
+            self._metadatas[memory_id] = record.get("metadata")
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        if meta.get("quantize", False) != self.quantize:
+            raise ValueError(f"Index at {self.path} was built with quantize={meta.get('quantize')}")
+        item_size = 1 if self.quantize else 4
+        rows = os.path.getsize(self._vectors_path) // (item_size * self.dim)
+        self._ids = [None] * rows
+        self._live = np.zeros(rows, dtype=bool)
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._apply(json.loads(line))
+
+    def _select(self, ids, where):
+        if ids is None:
+            candidates = sorted(self._rows, key=self._rows.get)
+        else:
+            candidates = [memory_id for memory_id in ids if memory_id in self._rows]
+        if where:
+            candidates = [memory_id for memory_id in candidates if matches_where(self._metadatas[memory_id] or {}, where)]
+        return candidates
+
+
+def matches_where(metadata, where):
+    """Evaluate a Chroma-style metadata filter ($and/$or/$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin)."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if not _compare(value, operator, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def _compare(value, operator, operand):
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported where operator: {operator}")